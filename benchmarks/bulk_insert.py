@@ -0,0 +1,121 @@
+"""
+Compare single-row `POST /trips` against `POST /trips/bulk`.
+
+Sends the same number of synthetic trips through both endpoints and
+reports rows/sec for each. The single-row path runs with a fixed number
+of concurrent clients; the bulk path sends one request per `--bulk-size`.
+
+Usage:
+    python -m benchmarks.bulk_insert --url http://localhost:8000 --rows 20000
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import httpx
+
+
+def synthetic_trip(rng: random.Random) -> Dict:
+    pickup = datetime(2025, 1, 1) + timedelta(seconds=rng.randrange(31 * 86400))
+    dropoff = pickup + timedelta(minutes=rng.randrange(3, 60))
+    distance = round(rng.uniform(0.3, 20.0), 2)
+    fare = round(3.0 + distance * 2.5, 2)
+    return {
+        "vendor_id": str(rng.choice([1, 2])),
+        "pickup_datetime": pickup.isoformat(),
+        "dropoff_datetime": dropoff.isoformat(),
+        "passenger_count": rng.randint(1, 4),
+        "trip_distance": distance,
+        "ratecode_id": 1,
+        "store_and_fwd_flag": "N",
+        "pu_location_id": rng.randint(1, 263),
+        "do_location_id": rng.randint(1, 263),
+        "payment_type": rng.choice([1, 2]),
+        "fare_amount": fare,
+        "extra": 1.0,
+        "mta_tax": 0.5,
+        "tip_amount": round(fare * 0.2, 2),
+        "tolls_amount": 0.0,
+        "improvement_surcharge": 1.0,
+        "total_amount": round(fare * 1.2 + 2.5, 2),
+        "congestion_surcharge": 2.5,
+        "airport_fee": 0.0,
+    }
+
+
+async def single_row(client: httpx.AsyncClient, trips: List[Dict], concurrency: int):
+    queue: "asyncio.Queue[Dict]" = asyncio.Queue()
+    for trip in trips:
+        queue.put_nowait(trip)
+
+    async def worker():
+        while not queue.empty():
+            trip = queue.get_nowait()
+            response = await client.post("/api/v1/trips", json=trip)
+            response.raise_for_status()
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+async def bulk(client: httpx.AsyncClient, trips: List[Dict], bulk_size: int):
+    for i in range(0, len(trips), bulk_size):
+        body = "\n".join(json.dumps(t) for t in trips[i : i + bulk_size])
+        response = await client.post(
+            "/api/v1/trips/bulk",
+            content=body,
+            headers={"content-type": "application/x-ndjson"},
+        )
+        response.raise_for_status()
+
+
+async def run(args) -> Dict[str, float]:
+    rng = random.Random(args.seed)
+    trips = [synthetic_trip(rng) for _ in range(args.rows)]
+    results = {}
+    async with httpx.AsyncClient(base_url=args.url, timeout=None) as client:
+        start = time.perf_counter()
+        await single_row(client, trips[: args.single_rows], args.concurrency)
+        elapsed = time.perf_counter() - start
+        results["single_row_rows_per_sec"] = args.single_rows / elapsed
+
+        start = time.perf_counter()
+        await bulk(client, trips, args.bulk_size)
+        elapsed = time.perf_counter() - start
+        results["bulk_rows_per_sec"] = args.rows / elapsed
+
+    results["speedup"] = (
+        results["bulk_rows_per_sec"] / results["single_row_rows_per_sec"]
+    )
+    return results
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument(
+        "--single-rows",
+        type=int,
+        default=2000,
+        help="Rows sent through the single-row endpoint (it is much slower)",
+    )
+    parser.add_argument("--bulk-size", type=int, default=10000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    results = asyncio.run(run(args))
+    print(
+        f"single-row: {results['single_row_rows_per_sec']:.0f} rows/s, "
+        f"bulk: {results['bulk_rows_per_sec']:.0f} rows/s "
+        f"({results['speedup']:.1f}x)"
+    )
+
+
+if __name__ == "__main__":
+    main()
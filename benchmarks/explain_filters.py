@@ -0,0 +1,93 @@
+"""
+Check that the common `GET /trips` filters are served by an index.
+
+Builds the same WHERE clauses as the API (`TaxiTripService.trip_filters`),
+runs `EXPLAIN (FORMAT JSON)` on the list query for each one, and exits
+non-zero if any plan falls back to a sequential scan of yellow_taxi_trips.
+On a small or freshly loaded table the planner prefers a seq scan; pass
+`--disable-seqscan` there to check that an index is at least usable.
+
+Usage:
+    python -m benchmarks.explain_filters [--disable-seqscan]
+"""
+
+import argparse
+import sys
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+from sqlalchemy import select, text
+
+from src import models
+from src.database import engine
+from src.services import TaxiTripService
+
+PICKUP_START = datetime(2025, 1, 1)
+PICKUP_END = datetime(2025, 1, 2)
+
+# Filter name -> trip_filters() arguments
+COMMON_FILTERS: Dict[str, Dict] = {
+    "pickup_range": {"start": PICKUP_START, "end": PICKUP_END},
+    "pickup_zone": {"pu_location_id": 132},
+    "pickup_zone_and_range": {
+        "pu_location_id": 132,
+        "start": PICKUP_START,
+        "end": PICKUP_END,
+    },
+    "dropoff_zone_and_range": {
+        "do_location_id": 138,
+        "start": PICKUP_START,
+        "end": PICKUP_END,
+    },
+    "payment_type_and_range": {
+        "payment_type": 2,
+        "start": PICKUP_START,
+        "end": PICKUP_END,
+    },
+}
+
+
+def _plan_nodes(node: Dict) -> Iterator[Dict]:
+    yield node
+    for child in node.get("Plans", []):
+        yield from _plan_nodes(child)
+
+
+def explain(conn, filters: Dict) -> List[str]:
+    """Return the node types of the plan for the filtered list query."""
+    stmt = (
+        select(models.YellowTaxiTrip)
+        .where(*TaxiTripService.trip_filters(**filters))
+        .limit(100)
+    )
+    compiled = stmt.compile(engine, compile_kwargs={"literal_binds": True})
+    plan = conn.execute(text(f"EXPLAIN (FORMAT JSON) {compiled}")).scalar()
+    return [node["Node Type"] for node in _plan_nodes(plan[0]["Plan"])]
+
+
+def uses_index(nodes: List[str]) -> bool:
+    """True if a plan reads yellow_taxi_trips through an index (B-tree or BRIN)."""
+    return "Seq Scan" not in nodes and any("Index" in n or "Bitmap" in n for n in nodes)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--disable-seqscan", action="store_true")
+    args = parser.parse_args(argv)
+
+    failures = 0
+    with engine.connect() as conn:
+        if args.disable_seqscan:
+            conn.execute(text("SET enable_seqscan = off"))
+        for name, filters in COMMON_FILTERS.items():
+            nodes = explain(conn, filters)
+            status = "ok" if uses_index(nodes) else "SEQ SCAN"
+            if status != "ok":
+                failures += 1
+            print(f"{name:<26} {status:<9} {' -> '.join(nodes)}")
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+"""
+Fixed-concurrency load test for the NYC Taxi API.
+
+Runs N concurrent clients against a set of read endpoints for a fixed
+duration and reports requests/sec and latency percentiles per endpoint.
+Pass `--baseline-url` to run the same load against a second deployment
+(e.g. the sync stack checked out from an older commit on another port)
+and print a side-by-side comparison.
+
+Usage:
+    python -m benchmarks.load_test --url http://localhost:8000 \
+        --baseline-url http://localhost:8001 --concurrency 64 --duration 30
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+DEFAULT_ENDPOINTS = [
+    "/api/v1/trips?limit=100",
+    "/api/v1/trips/1",
+    "/api/v1/statistics",
+]
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an unsorted list of samples."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[rank]
+
+
+async def _worker(
+    client: httpx.AsyncClient,
+    path: str,
+    deadline: float,
+    latencies: List[float],
+    errors: List[int],
+):
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            response = await client.get(path)
+            if response.status_code >= 500:
+                errors.append(response.status_code)
+        except httpx.HTTPError:
+            errors.append(0)
+        latencies.append(time.perf_counter() - start)
+
+
+async def run_endpoint(
+    base_url: str, path: str, concurrency: int, duration: float
+) -> Dict[str, float]:
+    """Hammer a single endpoint with `concurrency` clients for `duration` seconds."""
+    latencies: List[float] = []
+    errors: List[int] = []
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits) as client:
+        # Warm up connections and server-side caches
+        await client.get(path)
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(
+            *(
+                _worker(client, path, deadline, latencies, errors)
+                for _ in range(concurrency)
+            )
+        )
+
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "rps": len(latencies) / duration,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+
+async def run_suite(
+    base_url: str, endpoints: List[str], concurrency: int, duration: float
+) -> Dict[str, Dict[str, float]]:
+    results = {}
+    for path in endpoints:
+        results[path] = await run_endpoint(base_url, path, concurrency, duration)
+        r = results[path]
+        print(
+            f"{base_url}{path}: {r['rps']:.1f} req/s, "
+            f"p50 {r['p50_ms']:.2f} ms, p99 {r['p99_ms']:.2f} ms, "
+            f"{r['errors']} errors"
+        )
+    return results
+
+
+def print_comparison(
+    current: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]]
+):
+    print(f"\n{'endpoint':<34} {'rps (base → new)':<21} p99 ms (base → new)")
+    for path, new in current.items():
+        old = baseline[path]
+        print(
+            f"{path:<34} {old['rps']:>8.1f} → {new['rps']:<8.1f}   "
+            f"{old['p99_ms']:>8.2f} → {new['p99_ms']:<8.2f}"
+        )
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--baseline-url", default=None)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--endpoint", action="append", dest="endpoints")
+    parser.add_argument("--output", default=None, help="Write results as JSON")
+    args = parser.parse_args(argv)
+
+    endpoints = args.endpoints or DEFAULT_ENDPOINTS
+    report = {
+        "concurrency": args.concurrency,
+        "duration": args.duration,
+        "current": asyncio.run(
+            run_suite(args.url, endpoints, args.concurrency, args.duration)
+        ),
+    }
+    if args.baseline_url:
+        report["baseline"] = asyncio.run(
+            run_suite(args.baseline_url, endpoints, args.concurrency, args.duration)
+        )
+        print_comparison(report["current"], report["baseline"])
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
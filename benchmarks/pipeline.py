@@ -0,0 +1,170 @@
+"""
+Compare the orchestrated pipeline with the standalone scripts run in turn.
+
+Both runs start from the same synthetic Parquet files and empty stores
+(DuckDB file, Postgres trips table, MongoDB collection, dedup index, OD
+cube and sketches):
+
+  sequential    DuckDB import of every file, then `python -m
+                src.duckdb_to_postgres`, then `python -m src.data_cleaner`
+  orchestrated  `python -m src.orchestrator --from-stage duckdb_import`
+
+Downloads are left out of both, as the files are generated locally. The
+run fails unless both clean the same number of trips into documents with
+the same fields.
+
+Usage:
+    python -m benchmarks.pipeline --rows 200000 --months 1 2 3
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from benchmarks.run import BenchContext, Skipped, _ensure_postgres
+from benchmarks.synthetic import write_months
+
+IMPORT_SCRIPT = """
+import sys
+from pathlib import Path
+from src.import_to_duckdb import DuckDBImporter
+importer = DuckDBImporter(sys.argv[1])
+importer.import_all_parquet_files(Path(sys.argv[2]))
+importer.close()
+"""
+
+
+def _reset(ctx: BenchContext, engine, text, collection):
+    ctx.duckdb_path.unlink(missing_ok=True)
+    for var in ("OD_MATRIX_DIR", "SKETCH_DIR", "DEDUP_DIR"):
+        shutil.rmtree(os.environ[var], ignore_errors=True)
+    with engine.begin() as conn:
+        conn.execute(text("TRUNCATE yellow_taxi_trips RESTART IDENTITY"))
+    collection.delete_many({})
+
+
+def _document_fields(collection) -> List[str]:
+    """Field names of one cleaned document (MongoDB's `_id` left out)."""
+    document = collection.find_one({}, {"_id": 0}) or {}
+    return sorted(document)
+
+
+def _run(args: List[str], env: Dict[str, str]) -> float:
+    started = time.perf_counter()
+    subprocess.run([sys.executable, *args], env=env, check=True)
+    return time.perf_counter() - started
+
+
+def compare(ctx: BenchContext) -> Dict[str, Any]:
+    """Wall-clock seconds of both runs; `seconds` is the orchestrated one."""
+    engine, text = _ensure_postgres()
+    from pymongo.errors import PyMongoError
+
+    from src.data_cleaner import DataCleaner
+
+    try:
+        cleaner = DataCleaner()
+    except PyMongoError as e:
+        raise Skipped(f"MongoDB unavailable: {e}")
+
+    env = dict(os.environ, DUCKDB_FILE=str(ctx.duckdb_path))
+    try:
+        _reset(ctx, engine, text, cleaner.collection)
+        steps = {
+            "duckdb_import": _run(
+                ["-c", IMPORT_SCRIPT, str(ctx.duckdb_path), str(ctx.data_dir)], env
+            ),
+            "postgres_export": _run(["-m", "src.duckdb_to_postgres"], env),
+            "clean": _run(["-m", "src.data_cleaner"], env),
+        }
+        sequential_rows = cleaner.collection.count_documents({})
+        sequential_fields = _document_fields(cleaner.collection)
+
+        _reset(ctx, engine, text, cleaner.collection)
+        orchestrated = _run(
+            [
+                "-m",
+                "src.orchestrator",
+                "--from-stage",
+                "duckdb_import",
+                "--year",
+                str(ctx.year),
+                "--months",
+                *map(str, ctx.months),
+                "--data-dir",
+                str(ctx.data_dir),
+                "--duckdb",
+                str(ctx.duckdb_path),
+            ],
+            env,
+        )
+        rows = cleaner.collection.count_documents({})
+        fields = _document_fields(cleaner.collection)
+    finally:
+        cleaner.close()
+
+    sequential = sum(steps.values())
+    return {
+        "seconds": orchestrated,
+        "sequential_seconds": sequential,
+        "sequential_steps": steps,
+        "speedup": sequential / orchestrated,
+        "rows": rows,
+        "sequential_rows": sequential_rows,
+        "fields": fields,
+        "sequential_fields": sequential_fields,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=200_000, help="Rows per month")
+    parser.add_argument("--year", type=int, default=2025)
+    parser.add_argument("--months", type=int, nargs="+", default=[1, 2, 3])
+    parser.add_argument("--dirty-rate", type=float, default=0.02)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="nyc_taxi_pipeline_") as tmp:
+        ctx = BenchContext(Path(tmp), args.year, args.months)
+        for var in ("OD_MATRIX_DIR", "SKETCH_DIR", "DEDUP_DIR"):
+            os.environ[var] = str(ctx.workdir / var.lower())
+        write_months(
+            ctx.data_dir, args.year, args.months, args.rows, args.dirty_rate, args.seed
+        )
+        try:
+            result = compare(ctx)
+        except Skipped as e:
+            print(f"skipped: {e}")
+            return 0
+
+    print(json.dumps(result, indent=2))
+    print(
+        f"sequential {result['sequential_seconds']:.1f} s, orchestrated "
+        f"{result['seconds']:.1f} s ({result['speedup']:.2f}x)"
+    )
+    failed = False
+    if result["rows"] != result["sequential_rows"]:
+        print(
+            f"FAIL orchestrated run cleaned {result['rows']} trips, "
+            f"sequential run {result['sequential_rows']}"
+        )
+        failed = True
+    if result["fields"] != result["sequential_fields"]:
+        print(
+            f"FAIL document fields differ: orchestrated {result['fields']}, "
+            f"sequential {result['sequential_fields']}"
+        )
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
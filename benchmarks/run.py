@@ -0,0 +1,327 @@
+"""
+Benchmark every pipeline stage and the main API endpoints on synthetic data.
+
+Stages, in order:
+  duckdb_import    DuckDBImporter.import_all_parquet_files on generated files
+  postgres_export  src.duckdb_to_postgres (DuckDB -> Postgres COPY)
+  clean            DataCleaner.process_batches (Postgres -> Mongo)
+  dlt_resource     NYCTaxiDLTPipeline resource, extract only (no destination)
+  api              main API endpoints, in process through httpx ASGITransport
+  startup          API cold import + startup (see benchmarks.startup)
+  pipeline         src.orchestrator vs the scripts run in turn (see
+                   benchmarks.pipeline); resets the DuckDB file and stores
+
+Postgres and Mongo are local stand-ins (e.g. `docker compose up postgres
+mongodb`). A dedicated `nyc_taxi_bench` database is created and its trips
+table truncated; the Mongo `cleaned_trips` collection is replaced. Stages
+whose service is unreachable are recorded as skipped.
+
+Results are written as JSON. With `--baseline`, the run fails (exit 1)
+when a stage is slower than the baseline by more than `--threshold`.
+
+Usage:
+    python -m benchmarks.run --rows 200000 --months 1 2 \
+        --baseline benchmarks/baseline.json --output benchmarks/results/latest.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+# Local stand-ins, set before any src module reads its configuration
+os.environ.setdefault("POSTGRES_HOST", "localhost")
+os.environ.setdefault("POSTGRES_DB", "nyc_taxi_bench")
+os.environ.setdefault("MONGO_HOST", "localhost")
+os.environ.setdefault("MONGO_PORT", "27019")
+
+from benchmarks.load_test import percentile  # noqa: E402
+from benchmarks.startup import measure as measure_startup  # noqa: E402
+from benchmarks.synthetic import write_months  # noqa: E402
+
+API_ENDPOINTS = [
+    "/api/v1/trips?limit=100",
+    "/api/v1/trips?limit=100&pu_location_id=132",
+    "/api/v1/trips/1",
+    "/api/v1/statistics",
+    "/api/v1/analytics/hour",
+]
+
+# Metric compared against the baseline for each kind of result (lower is better)
+REGRESSION_METRICS = ("seconds", "p99_ms")
+
+
+class Skipped(Exception):
+    """Raised by a stage whose backing service is not available."""
+
+
+class BenchContext:
+    def __init__(self, workdir: Path, year: int, months: List[int]):
+        self.workdir = workdir
+        self.year = year
+        self.months = months
+        self.data_dir = workdir / "raw"
+        self.duckdb_path = workdir / "bench.duckdb"
+
+
+def _timed(fn: Callable[[], int]) -> Dict[str, Any]:
+    started = time.perf_counter()
+    rows = fn()
+    seconds = time.perf_counter() - started
+    return {"seconds": seconds, "rows": rows, "rows_per_sec": rows / seconds}
+
+
+def _ensure_postgres():
+    import psycopg2
+    from psycopg2 import sql
+
+    params = dict(
+        user=os.environ.get("POSTGRES_USER", "postgres"),
+        password=os.environ.get("POSTGRES_PASSWORD", "postgres"),
+        host=os.environ["POSTGRES_HOST"],
+        port=int(os.environ.get("POSTGRES_PORT", 5432)),
+    )
+    try:
+        conn = psycopg2.connect(dbname="postgres", connect_timeout=3, **params)
+    except psycopg2.OperationalError as e:
+        raise Skipped(f"Postgres unavailable: {e}".strip())
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT 1 FROM pg_database WHERE datname = %s",
+            [os.environ["POSTGRES_DB"]],
+        )
+        if cur.fetchone() is None:
+            cur.execute(
+                sql.SQL("CREATE DATABASE {}").format(
+                    sql.Identifier(os.environ["POSTGRES_DB"])
+                )
+            )
+    conn.close()
+
+    from src.database import engine, init_db
+    from sqlalchemy import text
+
+    init_db()
+    return engine, text
+
+
+def bench_duckdb_import(ctx: BenchContext) -> Dict[str, Any]:
+    from src.import_to_duckdb import DuckDBImporter
+
+    ctx.duckdb_path.unlink(missing_ok=True)
+    importer = DuckDBImporter(str(ctx.duckdb_path))
+
+    def run():
+        importer.import_all_parquet_files(ctx.data_dir)
+        count = importer.conn.execute("SELECT COUNT(*) FROM yellow_taxi_trips")
+        return count.fetchone()[0]
+
+    try:
+        return _timed(run)
+    finally:
+        importer.close()
+
+
+def bench_postgres_export(ctx: BenchContext) -> Dict[str, Any]:
+    engine, text = _ensure_postgres()
+    with engine.begin() as conn:
+        conn.execute(text("TRUNCATE yellow_taxi_trips RESTART IDENTITY"))
+
+    def run():
+        env = dict(os.environ, DUCKDB_FILE=str(ctx.duckdb_path))
+        subprocess.run(
+            [sys.executable, "-m", "src.duckdb_to_postgres"], env=env, check=True
+        )
+        with engine.connect() as conn:
+            count = conn.execute(text("SELECT COUNT(*) FROM yellow_taxi_trips"))
+            return count.scalar()
+
+    return _timed(run)
+
+
+def bench_clean(ctx: BenchContext) -> Dict[str, Any]:
+    _ensure_postgres()
+    from pymongo.errors import PyMongoError
+
+    from src.data_cleaner import DataCleaner
+
+    try:
+        cleaner = DataCleaner()
+    except PyMongoError as e:
+        raise Skipped(f"MongoDB unavailable: {e}")
+
+    def run():
+        cleaner.process_batches()
+        return cleaner.collection.count_documents({})
+
+    try:
+        return _timed(run)
+    finally:
+        cleaner.close()
+
+
+def bench_dlt_resource(ctx: BenchContext) -> Dict[str, Any]:
+    from src.dlt_pipeline import NYCTaxiDLTPipeline
+
+    pipeline = NYCTaxiDLTPipeline(
+        year=ctx.year, months=ctx.months, data_dir=ctx.data_dir
+    )
+    resource = pipeline.get_resource()
+    return _timed(lambda: sum(1 for _ in resource()))
+
+
+def bench_api(ctx: BenchContext, requests_per_endpoint: int = 200) -> Dict[str, Any]:
+    _ensure_postgres()
+    os.environ["DUCKDB_FILE"] = str(ctx.duckdb_path)
+    import httpx
+
+    from src.main import app
+
+    async def run() -> Dict[str, Any]:
+        results = {}
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench"
+        ) as client:
+            for path in API_ENDPOINTS:
+                latencies = []
+                started = time.perf_counter()
+                for _ in range(requests_per_endpoint):
+                    t0 = time.perf_counter()
+                    response = await client.get(path)
+                    response.raise_for_status()
+                    latencies.append(time.perf_counter() - t0)
+                elapsed = time.perf_counter() - started
+                results[path] = {
+                    "rps": requests_per_endpoint / elapsed,
+                    "p50_ms": percentile(latencies, 50) * 1000,
+                    "p99_ms": percentile(latencies, 99) * 1000,
+                }
+        return results
+
+    return asyncio.run(run())
+
+
+def bench_startup(ctx: BenchContext) -> Dict[str, Any]:
+    return measure_startup()
+
+
+def bench_pipeline(ctx: BenchContext) -> Dict[str, Any]:
+    from benchmarks.pipeline import compare
+
+    return compare(ctx)
+
+
+STAGES: Dict[str, Callable[[BenchContext], Dict[str, Any]]] = {
+    "duckdb_import": bench_duckdb_import,
+    "postgres_export": bench_postgres_export,
+    "clean": bench_clean,
+    "dlt_resource": bench_dlt_resource,
+    "api": bench_api,
+    "startup": bench_startup,
+    "pipeline": bench_pipeline,
+}
+
+
+def _flatten(results: Dict[str, Any], prefix: str = "") -> Dict[str, Dict[str, Any]]:
+    """Map `stage` / `api:<endpoint>` to their metric dicts."""
+    flat = {}
+    for name, value in results.items():
+        key = f"{prefix}{name}"
+        nested = isinstance(value, dict) and any(
+            isinstance(v, dict) for v in value.values()
+        )
+        if nested:
+            flat.update(_flatten(value, prefix=f"{key}:"))
+        else:
+            flat[key] = value
+    return flat
+
+
+def find_regressions(
+    current: Dict[str, Any], baseline: Dict[str, Any], threshold: float
+) -> List[str]:
+    """List every stage or endpoint slower than baseline * (1 + threshold)."""
+    regressions = []
+    base = _flatten(baseline)
+    for name, metrics in _flatten(current).items():
+        if name not in base or "skipped" in metrics or "skipped" in base[name]:
+            continue
+        for metric in REGRESSION_METRICS:
+            if metric in metrics and metric in base[name]:
+                limit = base[name][metric] * (1 + threshold)
+                if metrics[metric] > limit:
+                    regressions.append(
+                        f"{name} {metric}: {metrics[metric]:.3f} > {limit:.3f} "
+                        f"(baseline {base[name][metric]:.3f})"
+                    )
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=200_000, help="Rows per month")
+    parser.add_argument("--year", type=int, default=2025)
+    parser.add_argument("--months", type=int, nargs="+", default=[1])
+    parser.add_argument("--dirty-rate", type=float, default=0.02)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--stage", action="append", choices=list(STAGES))
+    parser.add_argument("--output", default="benchmarks/results/latest.json")
+    parser.add_argument("--baseline", default=None)
+    parser.add_argument("--threshold", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    report: Dict[str, Any] = {
+        "created_at": datetime.utcnow().isoformat(),
+        "params": {
+            "rows_per_month": args.rows,
+            "months": args.months,
+            "dirty_rate": args.dirty_rate,
+            "seed": args.seed,
+        },
+        "results": {},
+    }
+
+    with tempfile.TemporaryDirectory(prefix="nyc_taxi_bench_") as tmp:
+        ctx = BenchContext(Path(tmp), args.year, args.months)
+        # Keep the derived stores (OD cube, sketches, dedup index) out of data/
+        for var in ("OD_MATRIX_DIR", "SKETCH_DIR", "DEDUP_DIR"):
+            os.environ[var] = str(ctx.workdir / var.lower())
+        write_months(
+            ctx.data_dir, args.year, args.months, args.rows, args.dirty_rate, args.seed
+        )
+        for name in args.stage or list(STAGES):
+            try:
+                result = STAGES[name](ctx)
+            except Skipped as e:
+                result = {"skipped": str(e)}
+            report["results"][name] = result
+            print(f"{name}: {json.dumps(result)}")
+
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"Results written to {output}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        regressions = find_regressions(
+            report["results"], baseline["results"], args.threshold
+        )
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+"""
+Measure the serialization cost of a `GET /trips` page.
+
+Compares the previous response path (ORM instances validated through
+`schemas.TaxiTripList` with `from_attributes`, then FastAPI's
+`jsonable_encoder` + `json.dumps`) against the fast path (column tuples
+zipped into dicts and encoded with orjson) for 100, 1k and 10k-row pages.
+No database is needed: rows are synthesized in memory.
+
+Usage:
+    python -m benchmarks.serialization [--repeat 20]
+"""
+
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+
+from src import models, schemas
+from src.services import ROW_COLUMN_NAMES
+
+PAGE_SIZES = [100, 1_000, 10_000]
+
+
+def synthetic_rows(n: int, seed: int = 42) -> List[tuple]:
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n):
+        pickup = datetime(2025, 1, 1) + timedelta(seconds=rng.randrange(31 * 86400))
+        distance = round(rng.uniform(0.3, 20.0), 2)
+        fare = round(3.0 + distance * 2.5, 2)
+        values = {
+            "id": i + 1,
+            "vendor_id": "2",
+            "pickup_datetime": pickup,
+            "dropoff_datetime": pickup + timedelta(minutes=rng.randrange(3, 60)),
+            "passenger_count": rng.randint(1, 4),
+            "trip_distance": distance,
+            "ratecode_id": 1,
+            "store_and_fwd_flag": "N",
+            "pu_location_id": rng.randint(1, 263),
+            "do_location_id": rng.randint(1, 263),
+            "payment_type": rng.choice([1, 2]),
+            "fare_amount": fare,
+            "extra": 1.0,
+            "mta_tax": 0.5,
+            "tip_amount": round(fare * 0.2, 2),
+            "tolls_amount": 0.0,
+            "improvement_surcharge": 1.0,
+            "total_amount": round(fare * 1.2 + 2.5, 2),
+            "congestion_surcharge": 2.5,
+            "airport_fee": 0.0,
+        }
+        rows.append(tuple(values[name] for name in ROW_COLUMN_NAMES))
+    return rows
+
+
+def orm_path(instances: list) -> bytes:
+    page = schemas.TaxiTripList(total=len(instances), trips=instances)
+    content = jsonable_encoder(page)
+    return json.dumps(
+        content, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def fast_path(rows: List[tuple]) -> bytes:
+    trips = [dict(zip(ROW_COLUMN_NAMES, row)) for row in rows]
+    return orjson.dumps({"total": len(rows), "trips": trips})
+
+
+def best_of(fn: Callable, arg, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(arg)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(repeat: int) -> Dict[int, Dict[str, float]]:
+    results = {}
+    for size in PAGE_SIZES:
+        rows = synthetic_rows(size)
+        instances = [
+            models.YellowTaxiTrip(**dict(zip(ROW_COLUMN_NAMES, row))) for row in rows
+        ]
+        orm_seconds = best_of(orm_path, instances, repeat)
+        fast_seconds = best_of(fast_path, rows, repeat)
+        results[size] = {
+            "orm_ms": orm_seconds * 1000,
+            "fast_ms": fast_seconds * 1000,
+            "speedup": orm_seconds / fast_seconds,
+        }
+    return results
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    print(f"{'rows':>7} {'orm+pydantic ms':>16} {'tuples+orjson ms':>17} {'speedup':>8}")
+    for size, r in run(args.repeat).items():
+        print(
+            f"{size:>7} {r['orm_ms']:>16.2f} {r['fast_ms']:>17.2f} "
+            f"{r['speedup']:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
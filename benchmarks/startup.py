@@ -0,0 +1,99 @@
+"""
+Measure and enforce the API cold-start budget.
+
+Each repetition starts a fresh interpreter that imports `src.main` and runs
+the app's startup handlers, with Postgres pointed at a closed port so any
+connection attempt at import or startup fails the check. The run fails
+(exit 1) when the median import + startup time exceeds the budget, or when
+one of the heavy pipeline modules is loaded by the API process.
+
+Usage:
+    python -m benchmarks.startup [--repeat 5] [--budget-ms 1500]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Any, Dict, List, Optional
+
+STARTUP_BUDGET_MS = float(os.getenv("STARTUP_BUDGET_MS", "1500"))
+
+# Modules only pipeline workers and scripts may load
+HEAVY_MODULES = (
+    "dlt",
+    "pandas",
+    "numpy",
+    "requests",
+    "pyarrow",
+    "duckdb",
+    "pymongo",
+)
+
+PROBE = """
+import asyncio, json, sys, time
+started = time.perf_counter()
+from src.main import app
+imported = time.perf_counter()
+asyncio.run(app.router.startup())
+ready = time.perf_counter()
+heavy = sorted(m for m in {modules!r} if m in sys.modules)
+print(json.dumps({{
+    "import_ms": (imported - started) * 1000,
+    "startup_ms": (ready - imported) * 1000,
+    "heavy_modules": heavy,
+}}))
+"""
+
+
+def probe_once() -> Dict[str, Any]:
+    env = dict(os.environ, POSTGRES_HOST="127.0.0.1", POSTGRES_PORT="1")
+    completed = subprocess.run(
+        [sys.executable, "-c", PROBE.format(modules=HEAVY_MODULES)],
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def measure(repeat: int = 5) -> Dict[str, Any]:
+    """Median cold import + startup time over `repeat` fresh interpreters."""
+    probes = [probe_once() for _ in range(repeat)]
+    total_ms = [p["import_ms"] + p["startup_ms"] for p in probes]
+    return {
+        "seconds": statistics.median(total_ms) / 1000,
+        "import_ms": statistics.median(p["import_ms"] for p in probes),
+        "startup_ms": statistics.median(p["startup_ms"] for p in probes),
+        "heavy_modules": sorted({m for p in probes for m in p["heavy_modules"]}),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=STARTUP_BUDGET_MS)
+    args = parser.parse_args(argv)
+
+    result = measure(args.repeat)
+    total_ms = result["seconds"] * 1000
+    print(
+        f"import {result['import_ms']:.0f} ms, startup {result['startup_ms']:.0f} ms, "
+        f"total {total_ms:.0f} ms (budget {args.budget_ms:.0f} ms)"
+    )
+
+    failed = False
+    if result["heavy_modules"]:
+        print(f"FAIL heavy modules loaded: {', '.join(result['heavy_modules'])}")
+        failed = True
+    if total_ms > args.budget_ms:
+        print(f"FAIL cold start over budget by {total_ms - args.budget_ms:.0f} ms")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+"""
+Deterministic generator of NYC-taxi-shaped Parquet files.
+
+Files use the raw TLC column names and types (`VendorID`,
+`tpep_pickup_datetime`, `PULocationID`, ...) so they go through the same
+code paths as real downloads. Distributions are rough but realistic:
+diurnal pickup profile, Zipf-like zone popularity, log-normal distances,
+metered fares, card/cash tipping. `dirty_rate` controls the share of rows
+that the cleaning rules should reject (negative amounts, impossible
+passenger counts, missing timestamps, absurd distances).
+
+Usage:
+    python -m benchmarks.synthetic --rows 1000000 --months 1 2 3 --out data/synthetic
+"""
+
+import argparse
+import calendar
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+N_ZONES = 265
+
+# Relative pickup volume per hour of day (NYC yellow cab shape)
+HOURLY_PROFILE = np.array(
+    [
+        3.0, 2.2, 1.6, 1.1, 0.9, 1.0, 2.0, 3.4, 4.3, 4.5, 4.6, 4.8,
+        5.0, 5.1, 5.4, 5.6, 5.6, 6.0, 6.6, 6.4, 5.8, 5.6, 5.2, 4.1,
+    ]
+)
+PAYMENT_TYPES = np.array([1, 2, 3, 4])
+PAYMENT_WEIGHTS = np.array([0.75, 0.21, 0.02, 0.02])
+
+
+def generate_month(
+    year: int, month: int, rows: int, dirty_rate: float = 0.02, seed: int = 42
+) -> pd.DataFrame:
+    """Generate `rows` trips picked up during `year`-`month`."""
+    rng = np.random.default_rng([seed, year, month])
+    days = calendar.monthrange(year, month)[1]
+
+    # Pickup times: uniform day, diurnal hour, uniform second within the hour
+    day = rng.integers(0, days, rows)
+    hour = rng.choice(24, rows, p=HOURLY_PROFILE / HOURLY_PROFILE.sum())
+    second = rng.integers(0, 3600, rows)
+    pickup = (
+        np.datetime64(f"{year}-{month:02d}-01T00:00:00")
+        + (day * 86400 + hour * 3600 + second).astype("timedelta64[s]")
+    )
+
+    # Zipf-like zone popularity (a few Manhattan zones dominate)
+    zone_weights = 1.0 / np.arange(1, N_ZONES + 1) ** 1.1
+    zone_ids = rng.permutation(N_ZONES) + 1
+    zone_p = zone_weights / zone_weights.sum()
+    pu = rng.choice(zone_ids, rows, p=zone_p)
+    do = rng.choice(zone_ids, rows, p=zone_p)
+
+    distance = np.round(rng.lognormal(mean=0.6, sigma=0.8, size=rows), 2)
+    speed_mph = np.clip(rng.normal(12, 4, rows), 3, 40)
+    duration_s = (distance / speed_mph * 3600 + rng.integers(60, 300, rows)).astype(
+        "int64"
+    )
+    dropoff = pickup + duration_s.astype("timedelta64[s]")
+
+    fare = np.round(3.0 + distance * 2.5 + duration_s / 60 * 0.7, 2)
+    payment_type = rng.choice(PAYMENT_TYPES, rows, p=PAYMENT_WEIGHTS)
+    tip = np.where(
+        payment_type == 1, np.round(fare * rng.uniform(0.1, 0.3, rows), 2), 0.0
+    )
+    tolls = np.where(rng.random(rows) < 0.05, 6.94, 0.0)
+    congestion = np.where(rng.random(rows) < 0.9, 2.5, 0.0)
+    airport = np.where(rng.random(rows) < 0.07, 1.75, 0.0)
+    extra = rng.choice([0.0, 1.0, 2.5], rows, p=[0.4, 0.4, 0.2])
+    total = np.round(fare + extra + 0.5 + tip + tolls + 1.0 + congestion + airport, 2)
+
+    df = pd.DataFrame(
+        {
+            "VendorID": rng.choice([1, 2], rows, p=[0.3, 0.7]).astype("int32"),
+            "tpep_pickup_datetime": pickup.astype("datetime64[us]"),
+            "tpep_dropoff_datetime": dropoff.astype("datetime64[us]"),
+            "passenger_count": rng.choice(
+                [1, 2, 3, 4, 5, 6], rows, p=[0.72, 0.15, 0.05, 0.03, 0.03, 0.02]
+            ).astype("float64"),
+            "trip_distance": distance,
+            "RatecodeID": np.where(rng.random(rows) < 0.95, 1.0, 2.0),
+            "store_and_fwd_flag": np.where(rng.random(rows) < 0.995, "N", "Y"),
+            "PULocationID": pu.astype("int32"),
+            "DOLocationID": do.astype("int32"),
+            "payment_type": payment_type.astype("int64"),
+            "fare_amount": fare,
+            "extra": extra,
+            "mta_tax": np.full(rows, 0.5),
+            "tip_amount": tip,
+            "tolls_amount": tolls,
+            "improvement_surcharge": np.full(rows, 1.0),
+            "total_amount": total,
+            "congestion_surcharge": congestion,
+            "Airport_fee": airport,
+        }
+    )
+    _inject_dirty_rows(df, rng, dirty_rate)
+    return df.sort_values("tpep_pickup_datetime", kind="stable").reset_index(
+        drop=True
+    )
+
+
+def _inject_dirty_rows(df: pd.DataFrame, rng: np.random.Generator, rate: float):
+    """Corrupt a `rate` share of rows with one defect each."""
+    n_dirty = int(len(df) * rate)
+    if n_dirty == 0:
+        return
+    idx = rng.choice(len(df), n_dirty, replace=False)
+    defect = rng.integers(0, 5, n_dirty)
+    df.loc[idx[defect == 0], "fare_amount"] *= -1
+    df.loc[idx[defect == 1], "passenger_count"] = 0.0
+    df.loc[idx[defect == 2], "trip_distance"] = 250.0
+    df.loc[idx[defect == 3], "tpep_dropoff_datetime"] = pd.NaT
+    df.loc[idx[defect == 4], "passenger_count"] = np.nan
+
+
+def write_months(
+    out_dir: Path,
+    year: int,
+    months: List[int],
+    rows: int,
+    dirty_rate: float = 0.02,
+    seed: int = 42,
+) -> List[Path]:
+    """Write one `yellow_tripdata_YYYY-MM.parquet` file per month."""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for month in months:
+        path = out_dir / f"yellow_tripdata_{year}-{month:02d}.parquet"
+        generate_month(year, month, rows, dirty_rate, seed).to_parquet(
+            path, index=False
+        )
+        paths.append(path)
+    return paths
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=100_000, help="Rows per month")
+    parser.add_argument("--year", type=int, default=2025)
+    parser.add_argument("--months", type=int, nargs="+", default=[1])
+    parser.add_argument("--dirty-rate", type=float, default=0.02)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default="data/synthetic")
+    args = parser.parse_args(argv)
+
+    for path in write_months(
+        Path(args.out), args.year, args.months, args.rows, args.dirty_rate, args.seed
+    ):
+        print(f"Wrote {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+import argparse
+import os
+import queue
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import date
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from src.cache import TTLCache
+
+DUCKDB_FILE = os.getenv("DUCKDB_FILE", "yellow_taxi.duckdb")
+ANALYTICS_POOL_SIZE = int(os.getenv("ANALYTICS_POOL_SIZE", "4"))
+ANALYTICS_CACHE_TTL = float(os.getenv("ANALYTICS_CACHE_TTL", "300"))
+ANALYTICS_CACHE_SIZE = int(os.getenv("ANALYTICS_CACHE_SIZE", "1024"))
+
+# File in the snapshot directory naming the snapshot to serve
+SNAPSHOT_POINTER = "CURRENT"
+
+# Group-by dimensions exposed by the API (name -> DuckDB expression)
+DIMENSIONS = {
+    "hour": "hour(tpep_pickup_datetime)",
+    "weekday": "isodow(tpep_pickup_datetime)",
+    "day": "CAST(tpep_pickup_datetime AS DATE)",
+    "pickup_zone": "PULocationID",
+    "dropoff_zone": "DOLocationID",
+    "payment_type": "payment_type",
+}
+
+analytics_cache = TTLCache(ttl=ANALYTICS_CACHE_TTL, maxsize=ANALYTICS_CACHE_SIZE)
+
+
+class AnalyticsUnavailable(Exception):
+    """
+    Raised when no analytics snapshot is published, or when it cannot be
+    opened or queried.
+    """
+
+
+def snapshot_dir(db_path: str) -> Path:
+    """Directory of the read-only copies of `db_path` served by the API."""
+    return Path(f"{db_path}.snapshots")
+
+
+def publish_snapshot(conn, db_path: str) -> Path:
+    """
+    Copy the database to a new snapshot through the writer's open connection
+    `conn` (after a CHECKPOINT the file holds every committed row), then
+    point `CURRENT` at it. Each copy gets a new name, as DuckDB caches open
+    databases by path; the previous one is kept for readers still opening it.
+    """
+    conn.execute("CHECKPOINT")
+    directory = snapshot_dir(db_path)
+    directory.mkdir(parents=True, exist_ok=True)
+    name = f"{time.time_ns()}-{uuid.uuid4().hex[:8]}.duckdb"
+    shutil.copyfile(db_path, directory / f"{name}.tmp")
+    os.replace(directory / f"{name}.tmp", directory / name)
+
+    current = directory / SNAPSHOT_POINTER
+    previous = current.read_text().strip() if current.exists() else None
+    (directory / f"{SNAPSHOT_POINTER}.tmp").write_text(name)
+    os.replace(directory / f"{SNAPSHOT_POINTER}.tmp", current)
+    for old in directory.glob("*.duckdb"):
+        if old.name not in (name, previous):
+            old.unlink(missing_ok=True)
+    return directory / name
+
+
+class _Generation:
+    """One read-only connection to one snapshot file and its cursors."""
+
+    def __init__(self, conn, size: int, version: str):
+        self.conn = conn
+        self.version = version
+        self.cursors: "queue.Queue[Any]" = queue.Queue()
+        self.borrowed = 0
+        self.retired = False
+        for _ in range(size):
+            self.cursors.put(conn.cursor())
+
+    def close(self):
+        while not self.cursors.empty():
+            self.cursors.get_nowait().close()
+        self.conn.close()
+
+
+class DuckDBReadPool:
+    """
+    Fixed-size pool of read-only DuckDB cursors over the published snapshot
+    of a database file. Importers write to the database itself and publish
+    a new snapshot when they finish, so the API never holds a lock on the
+    file they write and keeps serving while they run. A new snapshot is
+    picked up on the next request (one small file read) and clears the
+    analytics cache; the previous connection is closed once its cursors are
+    returned.
+    duckdb is imported lazily so the API starts fast.
+    """
+
+    def __init__(self, db_path: str, size: int):
+        self.db_path = db_path
+        self.directory = snapshot_dir(db_path)
+        self.size = size
+        self._current: Optional[_Generation] = None
+        self._lock = threading.Lock()
+
+    def version(self) -> str:
+        """File name of the current snapshot."""
+        try:
+            return (self.directory / SNAPSHOT_POINTER).read_text().strip()
+        except FileNotFoundError:
+            raise AnalyticsUnavailable(
+                f"No analytics snapshot in {self.directory}; run an import or "
+                "`python -m src.analytics` to publish one"
+            )
+
+    def _acquire(self) -> _Generation:
+        version = self.version()
+        with self._lock:
+            current = self._current
+            if current is None or current.version != version:
+                import duckdb
+
+                try:
+                    conn = duckdb.connect(
+                        str(self.directory / version), read_only=True
+                    )
+                except duckdb.Error as e:
+                    raise AnalyticsUnavailable(str(e)) from e
+                if current is not None:
+                    self._retire(current)
+                    analytics_cache.invalidate()
+                current = self._current = _Generation(conn, self.size, version)
+            current.borrowed += 1
+            return current
+
+    def _retire(self, generation: _Generation):
+        generation.retired = True
+        if generation.borrowed == 0:
+            generation.close()
+
+    def _release(self, generation: _Generation, cursor):
+        with self._lock:
+            generation.cursors.put(cursor)
+            generation.borrowed -= 1
+            if generation.retired and generation.borrowed == 0:
+                generation.close()
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a cursor on the latest snapshot for the duration of the block.
+        DuckDB errors raised inside it surface as AnalyticsUnavailable.
+        """
+        import duckdb
+
+        generation = self._acquire()
+        cursor = generation.cursors.get()
+        try:
+            yield cursor
+        except duckdb.Error as e:
+            raise AnalyticsUnavailable(str(e)) from e
+        finally:
+            self._release(generation, cursor)
+
+    def close(self):
+        """Close every cursor and the underlying connection."""
+        with self._lock:
+            if self._current is not None:
+                self._retire(self._current)
+                self._current = None
+
+
+pool = DuckDBReadPool(DUCKDB_FILE, ANALYTICS_POOL_SIZE)
+
+
+def aggregate_trips(
+    group_by: str,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    pu_location_id: Optional[int] = None,
+    do_location_id: Optional[int] = None,
+    payment_type: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Run a filtered, grouped aggregation on the DuckDB trips table.
+    Results are cached by their full parameter set.
+    """
+    # Keyed by snapshot too: results never outlive the import they came from
+    cache_key = (
+        pool.version(),
+        group_by,
+        start,
+        end,
+        pu_location_id,
+        do_location_id,
+        payment_type,
+    )
+    rows = analytics_cache.get(cache_key)
+    if rows is not None:
+        return rows
+
+    key_expr = DIMENSIONS[group_by]
+    conditions, params = [], []
+    if start is not None:
+        conditions.append("tpep_pickup_datetime >= ?")
+        params.append(start)
+    if end is not None:
+        conditions.append("tpep_pickup_datetime < ?")
+        params.append(end)
+    if pu_location_id is not None:
+        conditions.append("PULocationID = ?")
+        params.append(pu_location_id)
+    if do_location_id is not None:
+        conditions.append("DOLocationID = ?")
+        params.append(do_location_id)
+    if payment_type is not None:
+        conditions.append("payment_type = ?")
+        params.append(payment_type)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    sql = f"""
+        SELECT
+            {key_expr} AS key,
+            COUNT(*) AS trips,
+            SUM(total_amount) AS revenue,
+            AVG(fare_amount) AS average_fare,
+            AVG(trip_distance) AS average_distance
+        FROM yellow_taxi_trips
+        {where}
+        GROUP BY 1
+        ORDER BY 1
+    """
+    with pool.connection() as cursor:
+        result = cursor.execute(sql, params)
+        columns = [desc[0] for desc in result.description]
+        rows = [dict(zip(columns, row)) for row in result.fetchall()]
+
+    analytics_cache.set(cache_key, rows)
+    return rows
+
+
+def main(argv: Optional[List[str]] = None):
+    import duckdb
+
+    parser = argparse.ArgumentParser(
+        description="Publish the analytics snapshot of a DuckDB database."
+    )
+    parser.add_argument("--duckdb", default=DUCKDB_FILE)
+    args = parser.parse_args(argv)
+
+    conn = duckdb.connect(args.duckdb)
+    try:
+        path = publish_snapshot(conn, args.duckdb)
+    finally:
+        conn.close()
+    print(f"Analytics snapshot published to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Memory-budgeted batch sizing shared by the batch stages.
+
+`MEMORY_BUDGET_MB` caps the resident memory a batch stage should reach.
+After each batch, `AdaptiveBatchSizer.observe` receives the batch's row
+count and in-memory size. It keeps a running bytes-per-row estimate and
+sizes the next batch so that it fits the budget together with the copies a
+stage makes of each batch (DataFrame, CSV buffer, records, ...). Process
+RSS is only a ceiling check: it seldom drops once batches are freed, so
+batches shrink by the overshoot only while RSS is above the budget. Batches
+at most double from one step to the next.
+
+`downcast` shrinks trip DataFrames (smallest integer types, categorical
+flags, float32 where every value survives the round trip) so more rows
+fit in the same budget.
+"""
+
+import os
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from src.metrics import current_rss_bytes
+
+MEMORY_BUDGET_MB = int(os.getenv("MEMORY_BUDGET_MB", "1024"))
+MIN_BATCH_ROWS = int(os.getenv("MIN_BATCH_ROWS", "1000"))
+MAX_BATCH_ROWS = int(os.getenv("MAX_BATCH_ROWS", "2000000"))
+
+# Low-cardinality string columns stored as categoricals
+CATEGORY_COLUMNS = ("store_and_fwd_flag",)
+
+class AdaptiveBatchSizer:
+    def __init__(
+        self,
+        initial: int = 50_000,
+        copies: float = 3.0,
+        budget_mb: int = MEMORY_BUDGET_MB,
+        min_rows: int = MIN_BATCH_ROWS,
+        max_rows: int = MAX_BATCH_ROWS,
+    ):
+        self.copies = copies
+        self.budget_bytes = budget_mb * 1024 * 1024
+        self.min_rows = min_rows
+        self.max_rows = max_rows
+        self.size = max(min_rows, min(initial, max_rows))
+        self.bytes_per_row: Optional[float] = None
+
+    def observe(self, rows: int, nbytes: int) -> int:
+        """Record a batch that is still in memory; return the next batch size."""
+        if rows <= 0:
+            return self.size
+        per_row = nbytes / rows
+        if self.bytes_per_row is None:
+            self.bytes_per_row = per_row
+        else:
+            self.bytes_per_row = 0.5 * self.bytes_per_row + 0.5 * per_row
+
+        target = self.budget_bytes / (self.bytes_per_row * self.copies)
+        rss = current_rss_bytes()
+        if rss > self.budget_bytes:
+            target *= self.budget_bytes / rss
+        self.size = max(self.min_rows, min(int(target), 2 * self.size, self.max_rows))
+        return self.size
+
+
+def frame_bytes(df: pd.DataFrame) -> int:
+    """In-memory size of a DataFrame, including string contents."""
+    return int(df.memory_usage(index=False, deep=True).sum())
+
+
+def downcast(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Shrink column dtypes: integers to the smallest type that holds them,
+    `CATEGORY_COLUMNS` to categoricals, and floats to float32 when every
+    value converts back to exactly the same float64.
+    """
+    for col in df.columns:
+        series = df[col]
+        kind = series.dtype.kind
+        if kind == "i":
+            df[col] = pd.to_numeric(series, downcast="integer")
+        elif kind == "f" and series.dtype != np.float32:
+            values = series.to_numpy()
+            narrow = values.astype(np.float32)
+            if np.array_equal(narrow.astype(np.float64), values, equal_nan=True):
+                df[col] = narrow
+        elif kind == "O" and col in CATEGORY_COLUMNS:
+            df[col] = series.astype("category")
+    return df
+
+
+def restore_floats(df: pd.DataFrame) -> pd.DataFrame:
+    """Widen float32 columns back to float64 (exact: see `downcast`)."""
+    for col in df.columns:
+        if df[col].dtype == np.float32:
+            df[col] = df[col].astype(np.float64)
+    return df
@@ -0,0 +1,118 @@
+import io
+import json
+import os
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List
+
+from pydantic import ValidationError
+from starlette.concurrency import run_in_threadpool
+
+from src import schemas
+
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "10000"))
+MAX_ERRORS_PER_BATCH = 5
+
+# Columns written by the bulk endpoint, in COPY order (id handled separately)
+TRIP_COLUMNS = list(schemas.TaxiTripBase.model_fields)
+
+PARQUET_TYPES = {
+    "application/vnd.apache.parquet",
+    "application/x-parquet",
+    "application/octet-stream",
+}
+NDJSON_TYPES = {"application/x-ndjson", "application/jsonl"}
+
+
+class BulkBatch:
+    """Validated rows of one input batch plus its rejection summary."""
+
+    def __init__(self, number: int):
+        self.number = number
+        self.new_rows: List[tuple] = []
+        self.upsert_rows: List[tuple] = []
+        self.rejected = 0
+        self.errors: List[str] = []
+
+    @property
+    def accepted(self) -> int:
+        return len(self.new_rows) + len(self.upsert_rows)
+
+    def result(self) -> schemas.BulkBatchResult:
+        return schemas.BulkBatchResult(
+            batch=self.number,
+            accepted=self.accepted,
+            rejected=self.rejected,
+            errors=self.errors,
+        )
+
+
+def _naive_utc(value: Any) -> Any:
+    # Trip timestamps are stored without time zone, in UTC
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def iter_records(body: bytes, content_type: str) -> Iterator[Dict[str, Any]]:
+    """Decode a JSON array, NDJSON or Parquet request body into records."""
+    media_type = (content_type or "").split(";")[0].strip().lower()
+
+    if media_type in PARQUET_TYPES:
+        import pyarrow.parquet as pq
+
+        parquet_file = pq.ParquetFile(io.BytesIO(body))
+        for batch in parquet_file.iter_batches(batch_size=BULK_BATCH_SIZE):
+            yield from batch.to_pylist()
+    elif media_type in NDJSON_TYPES:
+        for line in body.splitlines():
+            if line.strip():
+                yield json.loads(line)
+    else:
+        payload = json.loads(body or b"[]")
+        if not isinstance(payload, list):
+            raise ValueError("Expected a JSON array of trips")
+        yield from payload
+
+
+def validate_batches(
+    records: Iterable[Dict[str, Any]], batch_size: int = BULK_BATCH_SIZE
+) -> Iterator[BulkBatch]:
+    """
+    Validate records against `TaxiTripBulkItem`, `batch_size` at a time.
+    Rows with an `id` are routed to the upsert path, the others are inserted.
+    """
+    batch = BulkBatch(1)
+    for record in records:
+        try:
+            item = schemas.TaxiTripBulkItem.model_validate(record)
+        except ValidationError as e:
+            batch.rejected += 1
+            if len(batch.errors) < MAX_ERRORS_PER_BATCH:
+                batch.errors.append(str(e.errors()[0]["msg"]))
+        else:
+            row = tuple(_naive_utc(getattr(item, c)) for c in TRIP_COLUMNS)
+            if item.id is None:
+                batch.new_rows.append(row)
+            else:
+                batch.upsert_rows.append((item.id,) + row)
+
+        if batch.accepted + batch.rejected >= batch_size:
+            yield batch
+            batch = BulkBatch(batch.number + 1)
+
+    if batch.accepted or batch.rejected:
+        yield batch
+
+
+async def parse_body(body: bytes, content_type: str) -> AsyncIterator[BulkBatch]:
+    """
+    Decode and validate a bulk request body one batch at a time, off the event
+    loop (raises ValueError). The raw body is held whole, but only the batch
+    being written is held as validated rows.
+    """
+    batches = validate_batches(iter_records(body, content_type))
+    while True:
+        batch = await run_in_threadpool(next, batches, None)
+        if batch is None:
+            return
+        yield batch
@@ -0,0 +1,206 @@
+import abc
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+class CacheBackend(abc.ABC):
+    """
+    Shared storage sitting behind an in-process cache, so several API
+    workers can reuse each other's entries. Values are stored as bytes.
+    A backend that cannot be reached behaves as empty and counts `errors`.
+    """
+
+    errors = 0
+
+    @abc.abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        ...
+
+    @abc.abstractmethod
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        ...
+
+    @abc.abstractmethod
+    def delete(self, key: str) -> None:
+        ...
+
+    @abc.abstractmethod
+    def clear(self) -> None:
+        ...
+
+
+class RedisBackend(CacheBackend):
+    """Redis-backed shared storage (requires the optional `redis` package)."""
+
+    def __init__(self, url: str, prefix: str = "nyc_taxi:"):
+        import redis
+
+        self.client = redis.Redis.from_url(
+            url, socket_timeout=0.05, socket_connect_timeout=0.5
+        )
+        self.prefix = prefix
+        self.redis_error = redis.RedisError
+        self._lock = threading.Lock()
+
+    def _failed(self) -> None:
+        # Timeouts and connection errors fall back to the database
+        with self._lock:
+            self.errors += 1
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            return self.client.get(self.prefix + key)
+        except self.redis_error:
+            self._failed()
+            return None
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        try:
+            self.client.set(self.prefix + key, value, px=int(ttl * 1000))
+        except self.redis_error:
+            self._failed()
+
+    def delete(self, key: str) -> None:
+        try:
+            self.client.delete(self.prefix + key)
+        except self.redis_error:
+            self._failed()
+
+    def clear(self) -> None:
+        try:
+            keys = list(self.client.scan_iter(match=self.prefix + "*"))
+            if keys:
+                self.client.delete(*keys)
+        except self.redis_error:
+            self._failed()
+
+
+def backend_from_url(url: Optional[str], namespace: str) -> Optional[CacheBackend]:
+    """
+    Build a shared backend from a URL such as `redis://host:6379/0`.
+    `namespace` keeps the keys of different caches apart.
+    """
+    if not url:
+        return None
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackend(url, prefix=f"nyc_taxi:{namespace}:")
+    raise ValueError(f"Unsupported cache backend URL: {url}")
+
+
+class TTLCache:
+    """
+    Thread-safe in-process cache whose entries expire after `ttl` seconds.
+    Used in front of expensive read paths (statistics, lookups) and
+    invalidated explicitly by the write paths.
+
+    With `maxsize` set the least recently used entry is evicted once the
+    cache is full. An optional `backend` is consulted on local misses and
+    written through on `set`; `serializer` is the (dumps, loads) pair used
+    to store values in it. Invalidations only reach the other workers
+    through the backend, so with one their local copies are kept for
+    `local_ttl` seconds at most. Hit, miss and eviction counters are kept for
+    monitoring.
+    """
+
+    def __init__(
+        self,
+        ttl: float,
+        maxsize: Optional[int] = None,
+        backend: Optional[CacheBackend] = None,
+        serializer: Optional[
+            Tuple[Callable[[Any], bytes], Callable[[bytes], Any]]
+        ] = None,
+        local_ttl: float = 1.0,
+    ):
+        self.ttl = ttl
+        self.local_ttl = ttl if backend is None else min(ttl, local_ttl)
+        self.maxsize = maxsize
+        self.backend = backend
+        self.serializer = serializer
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.backend_hits = 0
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get_local(self, key: Hashable) -> Tuple[bool, Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, value
+
+    def _set_local(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.local_ttl, value)
+            self._entries.move_to_end(key)
+            if self.maxsize is not None:
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+
+    def get(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        """Return the cached value for `key`, or `default` if missing or expired."""
+        found, value = self._get_local(key)
+        if found:
+            return value
+
+        if self.backend is not None:
+            data = self.backend.get(str(key))
+            if data is not None:
+                value = self.serializer[1](data)
+                self._set_local(key, value)
+                with self._lock:
+                    self.backend_hits += 1
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return default
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Store `value` under `key` for `ttl` seconds."""
+        self._set_local(key, value)
+        if self.backend is not None:
+            self.backend.set(str(key), self.serializer[0](value), self.ttl)
+
+    def invalidate(self, key: Optional[Hashable] = None) -> None:
+        """Drop a single entry, or the whole cache when `key` is None."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+        if self.backend is not None:
+            if key is None:
+                self.backend.clear()
+            else:
+                self.backend.delete(str(key))
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of size and hit/miss/eviction counters."""
+        with self._lock:
+            lookups = self.hits + self.backend_hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "local_ttl": self.local_ttl,
+                "hits": self.hits,
+                "backend_hits": self.backend_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "backend_errors": self.backend.errors if self.backend else None,
+                "hit_ratio": (self.hits + self.backend_hits) / lookups
+                if lookups
+                else None,
+            }
@@ -1,10 +1,17 @@
 import os
+import threading
+from datetime import datetime
+from typing import Dict, Iterator
 import pandas as pd
 from sqlalchemy import create_engine, text
 from pymongo import MongoClient
 from tqdm import tqdm
+from src.batching import AdaptiveBatchSizer, downcast, frame_bytes, restore_floats
+from src.metrics import run_report, track_stage
+from src.sketches import TripSketch, save_monthly, update_monthly
 
-CHUNK_SIZE = 500_000  # batch size, adjust for your memory
+INITIAL_BATCH_ROWS = 50_000  # then sized to fit MEMORY_BUDGET_MB
+MONGO_INSERT_ROWS = 10_000  # records are built and inserted in slices of this size
 
 
 class DataCleaner:
@@ -14,6 +21,8 @@ class DataCleaner:
         self.mongo_client = self._get_mongo_client()
         self.mongo_db = self.mongo_client["nyc_taxi"]
         self.collection = self.mongo_db["cleaned_trips"]
+        # Cleaning workers may share one cleaner and one set of sketches
+        self._sketch_lock = threading.Lock()
         print("Connections initialized successfully (PostgreSQL & MongoDB)")
 
     # Connections
@@ -77,6 +86,57 @@ class DataCleaner:
 
         return df
 
+    def store_cleaned(self, df: pd.DataFrame, sketches: Dict[str, TripSketch]) -> int:
+        """
+        Clean one batch of Postgres-shaped trips, add it to the monthly
+        `sketches` and insert it into MongoDB. Returns the rows kept.
+        """
+        cleaned_df = self.clean_chunk(df)
+        if cleaned_df.empty:
+            return 0
+        for col in ["pickup_datetime", "dropoff_datetime"]:
+            if col in cleaned_df.columns:
+                cleaned_df[col] = pd.to_datetime(cleaned_df[col])
+        cleaned_df = restore_floats(cleaned_df)
+        with self._sketch_lock:
+            update_monthly(sketches, cleaned_df, "pickup_datetime", "dropoff_datetime")
+        for start in range(0, len(cleaned_df), MONGO_INSERT_ROWS):
+            records = cleaned_df.iloc[start : start + MONGO_INSERT_ROWS].to_dict(
+                orient="records"
+            )
+            self.collection.insert_many(records)
+        return len(cleaned_df)
+
+    # Single-month access, used when resuming the orchestrator at the clean stage
+    def read_month(self, start: datetime, end: datetime) -> Iterator[pd.DataFrame]:
+        """Yield Postgres trips picked up in [start, end) in memory-sized batches."""
+        sizer = AdaptiveBatchSizer(initial=INITIAL_BATCH_ROWS, copies=4)
+        last_id = 0
+        with self.postgres_engine.connect() as conn:
+            while True:
+                # Keyset pagination on the primary key: no OFFSET re-scans
+                query = text(f"""
+                    SELECT * FROM yellow_taxi_trips
+                    WHERE id > :last_id
+                      AND pickup_datetime >= :start AND pickup_datetime < :end
+                    ORDER BY id
+                    LIMIT {sizer.size}
+                """)
+                params = {"last_id": last_id, "start": start, "end": end}
+                df = downcast(pd.read_sql(query, conn, params=params))
+                if df.empty:
+                    return
+                last_id = int(df["id"].max())
+                sizer.observe(len(df), frame_bytes(df))
+                yield df
+
+    def delete_month(self, start: datetime, end: datetime) -> int:
+        """Remove cleaned trips picked up in [start, end) from MongoDB."""
+        result = self.collection.delete_many(
+            {"pickup_datetime": {"$gte": start, "$lt": end}}
+        )
+        return result.deleted_count
+
     # Batch processing
     def process_batches(self):
         """Process PostgreSQL table in batches and save cleaned data to MongoDB."""
@@ -86,7 +146,10 @@ class DataCleaner:
             ).scalar()
             print(f"Total rows in PostgreSQL: {total_rows}")
 
-            offset = 0
+            last_id = 0
+            sketches = {}
+            # read_sql materialises the rows as tuples before building the frame
+            sizer = AdaptiveBatchSizer(initial=INITIAL_BATCH_ROWS, copies=4)
             pbar = tqdm(total=total_rows, desc="Processing batches", unit="rows")
 
             # Clear existing MongoDB data
@@ -94,25 +157,31 @@ class DataCleaner:
             if existing_count > 0:
                 self.collection.delete_many({})
 
-            while offset < total_rows:
+            while True:
+                # Keyset pagination on the primary key, as in `read_month`
                 query = text(f"""
                     SELECT * FROM yellow_taxi_trips
+                    WHERE id > :last_id
                     ORDER BY id
-                    LIMIT {CHUNK_SIZE} OFFSET {offset}
+                    LIMIT {sizer.size}
                 """)
-                df_chunk = pd.read_sql(query, conn)
-                cleaned_df = self.clean_chunk(df_chunk)
-
-                if not cleaned_df.empty:
-                    for col in ["pickup_datetime", "dropoff_datetime"]:
-                        if col in cleaned_df.columns:
-                            cleaned_df[col] = pd.to_datetime(cleaned_df[col])
-                    records = cleaned_df.to_dict(orient="records")
-                    self.collection.insert_many(records)
-
-                offset += CHUNK_SIZE
+                params = {"last_id": last_id}
+                with track_stage("clean", item=f"ids > {last_id}") as stage:
+                    df_chunk = downcast(pd.read_sql(query, conn, params=params))
+                    stage.bytes_read = frame_bytes(df_chunk)
+                    stage.rows_in = len(df_chunk)
+                    stage.rows_out = self.store_cleaned(df_chunk, sketches)
+                    sizer.observe(len(df_chunk), stage.bytes_read)
+
+                if df_chunk.empty:
+                    break
+                last_id = int(df_chunk["id"].max())
                 pbar.update(len(df_chunk))
             pbar.close()
+
+        # Monthly quantile/cardinality sketches, rebuilt like the collection
+        save_monthly(sketches, prune=True)
+        print(f"Saved trip sketches for {len(sketches)} months.")
         print("Batch cleaning complete!")
 
     # Close MongoDB
@@ -125,6 +194,7 @@ class DataCleaner:
 if __name__ == "__main__":
     cleaner = DataCleaner()
     try:
-        cleaner.process_batches()
+        with run_report("data_cleaner"):
+            cleaner.process_batches()
     finally:
         cleaner.close()
@@ -1,5 +1,7 @@
 import os
-from sqlalchemy import create_engine
+from typing import List
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
@@ -10,14 +12,35 @@ POSTGRES_DB = os.getenv("POSTGRES_DB", "nyc_taxi")
 POSTGRES_HOST = os.getenv("POSTGRES_HOST", "localhost")
 POSTGRES_PORT = os.getenv("POSTGRES_PORT", "5432")
 
+# Connection pool tuning (shared by the sync and async engines)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+POOL_OPTIONS = {
+    "pool_size": DB_POOL_SIZE,
+    "max_overflow": DB_MAX_OVERFLOW,
+    "pool_timeout": DB_POOL_TIMEOUT,
+    "pool_recycle": DB_POOL_RECYCLE,
+    "pool_pre_ping": True,
+}
+
 # Build pgsql url
 DATABASE_URL = f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
+ASYNC_DATABASE_URL = f"postgresql+asyncpg://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
 
-# SQLAlchemy engine
-engine = create_engine(DATABASE_URL)
+# SQLAlchemy engine (pipeline jobs, scripts)
+engine = create_engine(DATABASE_URL, **POOL_OPTIONS)
 
-# Session maker
+# Async SQLAlchemy engine (API request handlers)
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **POOL_OPTIONS)
+
+# Session makers
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, autoflush=False, expire_on_commit=False
+)
 
 # Base class orm
 Base = declarative_base()
@@ -35,12 +58,66 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    """
+    Dépendance FastAPI pour obtenir une session asynchrone (asyncpg).
+    Ferme automatiquement la session après usage.
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
 def init_db():
     """
     Initialise les tables de la base de données en important les modèles.
-    À appeler au démarrage de l'application si nécessaire.
+    Exécuté une seule fois par `python -m src.migrate`, jamais au démarrage
+    de l'API.
     """
     # Importer les modèles ici pour que Base connaisse les tables
     from src import models  # Assure-toi que src/models.py existe
 
     Base.metadata.create_all(bind=engine)
+
+    # create_all skips existing tables: add any column or index declared since
+    existing = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            columns = {c["name"] for c in existing.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in columns and column.nullable:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    conn.execute(
+                        text(
+                            f"ALTER TABLE {table.name} "
+                            f"ADD COLUMN IF NOT EXISTS {column.name} {column_type}"
+                        )
+                    )
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+
+def missing_schema(conn) -> List[str]:
+    """Tables and columns declared on the models but absent from the database."""
+    from src import models  # noqa: F401
+
+    existing = inspect(conn)
+    tables = set(existing.get_table_names())
+    missing = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in tables:
+            missing.append(table.name)
+            continue
+        columns = {c["name"] for c in existing.get_columns(table.name)}
+        missing.extend(
+            f"{table.name}.{column.name}"
+            for column in table.columns
+            if column.name not in columns
+        )
+    return missing
+
+
+async def check_schema() -> List[str]:
+    """Run `missing_schema` over the async engine (used by the readiness probe)."""
+    async with async_engine.connect() as conn:
+        return await conn.run_sync(missing_schema)
@@ -0,0 +1,335 @@
+"""
+Ingest-time trip deduplication.
+
+Every trip is reduced to a 64-bit hash of a canonical key (vendor, pickup
+and dropoff times, zones, distance, total amount). A `DedupIndex` keeps
+the hashes already loaded into a destination as sorted uint64 segments on
+disk (memory-mapped), so checking a batch costs O(batch * log(stored))
+and never scans the destination table.
+
+Loaders follow a reserve/commit protocol: `filter_new` drops rows already
+loaded (or repeated within the run), `reserve` remembers the survivors,
+and `commit` persists them once the destination has committed, so a
+failed load never hides rows from the next attempt. Threads sharing an
+index use `claim`, which reloads the committed segments, filters and
+reserves as one step, and commit or roll back their own reservation.
+
+Only the batch loaders (DuckDB -> Postgres export and the dlt pipeline)
+go through an index. Trips written through the API are neither checked
+against it nor added to it: they are explicit client writes, and bulk
+upserts are keyed by id instead. Loaders open their index with
+`open_index`, which rebuilds it from Postgres when rows were deleted or the
+table truncated since its last use, so a deleted trip can be loaded again.
+
+Segments are merged size-tiered (a segment is merged into the previous
+one while it is at least half its size), which keeps the number of
+segments logarithmic and the amortised write cost per hash O(log n).
+
+Seed an index from rows already in Postgres (e.g. after a first deploy):
+
+    python -m src.dedup yellow_taxi_trips
+"""
+
+import argparse
+import fcntl
+import json
+import os
+import shutil
+import threading
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+DEDUP_DIR = os.getenv("DEDUP_DIR", "data/dedup")
+
+# Canonical key column -> kind
+KEY_COLUMNS = {
+    "vendor_id": "int",
+    "pickup_datetime": "timestamp",
+    "dropoff_datetime": "timestamp",
+    "pu_location_id": "int",
+    "do_location_id": "int",
+    "trip_distance": "float",
+    "total_amount": "float",
+}
+
+# Key columns as named in the Postgres `yellow_taxi_trips` table
+TRIP_COLUMNS = {name: name for name in KEY_COLUMNS}
+
+# Key columns as loaded by the dlt pipeline (raw TLC names, lower-cased)
+DLT_COLUMNS = {
+    "vendor_id": "vendorid",
+    "pickup_datetime": "tpep_pickup_datetime",
+    "dropoff_datetime": "tpep_dropoff_datetime",
+    "pu_location_id": "pulocationid",
+    "do_location_id": "dolocationid",
+    "trip_distance": "trip_distance",
+    "total_amount": "total_amount",
+}
+
+# Destination tables whose index can be rebuilt from Postgres
+TABLES = {
+    "yellow_taxi_trips": TRIP_COLUMNS,
+    "nyc_taxi_dlt.yellow_taxi_trips": DLT_COLUMNS,
+}
+
+MANIFEST = "manifest.json"
+
+# Identity of a table's contents with respect to deletions: TRUNCATE gives
+# it a new file node, DELETEs bump the cumulative deleted-row statistic
+SOURCE_STATE_SQL = """
+    SELECT pg_relation_filenode(c.oid), COALESCE(s.n_tup_del, 0)
+    FROM pg_class AS c
+    LEFT JOIN pg_stat_user_tables AS s ON s.relid = c.oid
+    WHERE c.oid = to_regclass(:table)
+"""
+
+
+def trip_hashes(df: pd.DataFrame, columns: Dict[str, str] = TRIP_COLUMNS) -> np.ndarray:
+    """
+    uint64 hash of each row's canonical key. `columns` maps canonical key
+    names to the DataFrame's column names. Values are normalised first
+    (integers, UTC-naive timestamps, amounts rounded to cents) so the same
+    trip hashes identically whichever store it was read from.
+    """
+    key = {}
+    for name, kind in KEY_COLUMNS.items():
+        values = df[columns[name]]
+        if kind == "timestamp":
+            values = pd.to_datetime(values, errors="coerce")
+            if values.dt.tz is not None:
+                values = values.dt.tz_convert(None)
+            key[name] = values.to_numpy("datetime64[ns]").view("int64")
+        elif kind == "int":
+            key[name] = pd.to_numeric(values, errors="coerce").fillna(-1).to_numpy(
+                "int64"
+            )
+        else:
+            key[name] = np.round(
+                pd.to_numeric(values, errors="coerce").to_numpy("float64"), 2
+            )
+    frame = pd.DataFrame(key, copy=False)
+    return pd.util.hash_pandas_object(frame, index=False).to_numpy()
+
+
+class DedupIndex:
+    """Persistent set of trip hashes for one destination table."""
+
+    def __init__(self, name: str, directory: str = DEDUP_DIR):
+        self.directory = Path(directory) / name
+        self._names: List[str] = []
+        # `source_state` of the destination when the index was last verified
+        self.source: Optional[List[int]] = None
+        self._segments: List[np.ndarray] = []
+        self._reserved: List[np.ndarray] = []
+        self._thread_lock = threading.RLock()
+        self._load()
+
+    def __len__(self) -> int:
+        return sum(segment.size for segment in self._segments)
+
+    def _load(self):
+        try:
+            manifest = json.loads((self.directory / MANIFEST).read_text())
+        except FileNotFoundError:
+            manifest = {"segments": []}
+        self._names = manifest["segments"]
+        self.source = manifest.get("source")
+        self._segments = [
+            np.load(self.directory / name, mmap_mode="r") for name in self._names
+        ]
+
+    @contextmanager
+    def _locked(self):
+        """Serialise writers across processes."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with open(self.directory / ".lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def contains(self, hashes: np.ndarray, reserved: bool = True) -> np.ndarray:
+        """Boolean mask of the hashes that are stored (or reserved)."""
+        found = np.zeros(hashes.size, dtype=bool)
+        segments = self._segments + self._reserved if reserved else self._segments
+        for segment in segments:
+            if segment.size:
+                position = np.searchsorted(segment, hashes)
+                np.minimum(position, segment.size - 1, out=position)
+                found |= segment[position] == hashes
+        return found
+
+    def filter_new(self, hashes: np.ndarray) -> np.ndarray:
+        """Mask of rows that are neither known nor repeated earlier in the batch."""
+        first = np.zeros(hashes.size, dtype=bool)
+        first[np.unique(hashes, return_index=True)[1]] = True
+        return first & ~self.contains(hashes)
+
+    def reserve(self, hashes: np.ndarray) -> np.ndarray:
+        """
+        Remember hashes being loaded; they count as known until rollback.
+        Returns the reservation, to commit or roll back on its own.
+        """
+        reservation = np.unique(hashes)
+        if reservation.size:
+            with self._thread_lock:
+                self._reserved.append(reservation)
+        return reservation
+
+    def claim(self, hashes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Thread-safe `filter_new` + `reserve` against the latest committed
+        segments. Returns the mask of new rows and their reservation.
+        """
+        with self._thread_lock:
+            self._load()
+            new_rows = self.filter_new(hashes)
+            return new_rows, self.reserve(hashes[new_rows])
+
+    def _take(self, reservations: Tuple[np.ndarray, ...]) -> List[np.ndarray]:
+        """Remove and return the given reservations (all of them if none given)."""
+        if not reservations:
+            taken, self._reserved = self._reserved, []
+            return taken
+        ids = {id(reservation) for reservation in reservations}
+        taken = [r for r in self._reserved if id(r) in ids]
+        self._reserved = [r for r in self._reserved if id(r) not in ids]
+        return taken
+
+    def rollback(self, *reservations: np.ndarray):
+        """Forget reservations (all of them if none given)."""
+        with self._thread_lock:
+            self._take(reservations)
+
+    def commit(self, *reservations: np.ndarray):
+        """
+        Persist reservations (all of them if none given) as a new segment,
+        merging small ones.
+        """
+        with self._thread_lock:
+            pending = self._take(reservations)
+            if not pending:
+                return
+            batch = np.unique(np.concatenate(pending))
+            try:
+                with self._locked():
+                    self._load()
+                    new = batch[~self.contains(batch, reserved=False)]
+                    if new.size:
+                        segments = list(self._segments) + [new]
+                        while (
+                            len(segments) > 1
+                            and segments[-2].size <= 2 * segments[-1].size
+                        ):
+                            last = segments.pop()
+                            segments[-1] = np.union1d(segments[-1], last)
+                        self._write(segments)
+            except BaseException:
+                self._reserved.extend(pending)
+                raise
+
+    def set_source(self, state: Optional[List[int]]):
+        """Record the destination state this index is known to match."""
+        with self._thread_lock, self._locked():
+            self._load()
+            self.source = state
+            self._write_manifest(self._names)
+
+    def _write_manifest(self, names: List[str]):
+        tmp = self.directory / f"{MANIFEST}.tmp"
+        tmp.write_text(json.dumps({"segments": names, "source": self.source}))
+        os.replace(tmp, self.directory / MANIFEST)
+
+    def _write(self, segments: List[np.ndarray]):
+        # Unchanged leading segments keep their files; the rest are rewritten
+        names = []
+        for i, segment in enumerate(segments):
+            if i < len(self._segments) and segment is self._segments[i]:
+                names.append(self._names[i])
+                continue
+            name = f"segment-{uuid.uuid4().hex}.npy"
+            np.save(self.directory / name, segment)
+            names.append(name)
+
+        self._write_manifest(names)
+        for stale in set(self._names) - set(names):
+            (self.directory / stale).unlink(missing_ok=True)
+        self._load()
+
+
+def source_state(table: str) -> Optional[List[int]]:
+    """
+    File node and deleted-row count of the Postgres `table`, or None while it
+    does not exist. Deletions show up once the server has flushed its
+    statistics, usually within a second of the deleting transaction.
+    """
+    from sqlalchemy import text
+
+    from src.database import engine
+
+    with engine.connect() as conn:
+        row = conn.execute(text(SOURCE_STATE_SQL), {"table": table}).first()
+    return None if row is None else [int(row[0]), int(row[1])]
+
+
+def open_index(table: str) -> DedupIndex:
+    """
+    Index of the Postgres `table` for a loader, rebuilt from the table first
+    if rows were deleted or the table truncated since it was last opened.
+    """
+    index = DedupIndex(table)
+    state = source_state(table)
+    if state is None or index.source == state:
+        return index
+    if index.source is None:
+        # First use of this index (or one written before states were kept)
+        index.set_source(state)
+        return index
+    print(f"Rows were deleted from {table}; rebuilding its dedup index")
+    return rebuild(table)
+
+
+def rebuild(table: str, chunk_size: int = 1_000_000) -> DedupIndex:
+    """Replace the index of `table` with the hashes of every row in Postgres."""
+    from sqlalchemy import text
+
+    from src.database import engine
+
+    columns = TABLES[table]
+    # Taken first, so deletions made while reading trigger another rebuild
+    state = source_state(table)
+    shutil.rmtree(Path(DEDUP_DIR) / table, ignore_errors=True)
+    index = DedupIndex(table)
+
+    select = ", ".join(columns.values())
+    with engine.connect().execution_options(stream_results=True) as conn:
+        for chunk in pd.read_sql(
+            text(f"SELECT {select} FROM {table}"), conn, chunksize=chunk_size
+        ):
+            hashes = trip_hashes(chunk, columns)
+            index.reserve(hashes[index.filter_new(hashes)])
+            index.commit()
+    index.set_source(state)
+    return index
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        description="Rebuild a dedup index from a Postgres table."
+    )
+    parser.add_argument("table", choices=list(TABLES))
+    parser.add_argument("--chunk-size", type=int, default=1_000_000)
+    args = parser.parse_args(argv)
+
+    index = rebuild(args.table, args.chunk_size)
+    print(f"Dedup index for {args.table}: {len(index)} trips")
+
+
+if __name__ == "__main__":
+    main()
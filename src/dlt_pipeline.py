@@ -1,13 +1,19 @@
 import dlt
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 from pathlib import Path
-from typing import Iterator, Dict, Any
+from typing import Iterator, Dict, Any, Callable, Optional
 import requests
 import logging
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
 import gc
+import time
 from datetime import datetime
+from src.batching import AdaptiveBatchSizer, downcast, frame_bytes, restore_floats
+from src.dedup import DLT_COLUMNS, DedupIndex, open_index, trip_hashes
+from src.metrics import run_report, track_stage
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
@@ -18,12 +24,41 @@ class NYCTaxiDLTPipeline:
     BASE_URL = "https://d37ci6vzurychx.cloudfront.net/trip-data"
     DATA_DIR = Path("data")
     MAX_WORKERS = 4
+    # Parquet read unit and record slice; frames are sized to MEMORY_BUDGET_MB
     BATCH_SIZE = 5000
-
-    def __init__(self):
-        """Initialize pipeline and determine latest available year/month."""
+    # Dedup index of the table loaded into each destination; only the
+    # Postgres tables can be indexed, other destinations load every trip
+    DEDUP_TABLES = {"postgres": "nyc_taxi_dlt.yellow_taxi_trips"}
+
+    def __init__(
+        self,
+        progress: Optional[Callable[..., None]] = None,
+        year: Optional[int] = None,
+        months: Optional[list[int]] = None,
+        data_dir: Optional[Path] = None,
+    ):
+        """
+        Initialize pipeline and determine latest available year/month.
+        `progress` is called with keyword arguments (stage, files_done,
+        files_total, rows, rows_per_sec) as the run advances. Passing `year`
+        and `months` skips the online detection (files already in
+        `data_dir` are not downloaded again).
+        """
+        self.progress = progress or (lambda **kwargs: None)
+        self.rows_extracted = 0
+        self.rows_duplicate = 0
+        self.batch_sizer = AdaptiveBatchSizer(initial=10 * self.BATCH_SIZE)
+        # Trips already loaded by earlier runs are dropped during extract;
+        # set by `run_pipeline` for destinations that have an index
+        self.dedup_index: Optional[DedupIndex] = None
+        if data_dir is not None:
+            self.DATA_DIR = Path(data_dir)
         self.DATA_DIR.mkdir(parents=True, exist_ok=True)
-        self.YEAR, self.months = self._get_available_months()
+        if year is not None and months is not None:
+            self.YEAR, self.months = year, months
+        else:
+            self.progress(stage="detecting")
+            self.YEAR, self.months = self._get_available_months()
         logging.info(
             f"Initialized NYCTaxiDLTPipeline for year {self.YEAR}, months {self.months}"
         )
@@ -53,9 +88,11 @@ class NYCTaxiDLTPipeline:
         if not file_path.exists():
             url = f"{self.BASE_URL}/{file_name}"
             try:
-                r = requests.get(url, timeout=30)
-                r.raise_for_status()
-                file_path.write_bytes(r.content)
+                with track_stage("download", item=file_name) as stage:
+                    r = requests.get(url, timeout=30)
+                    r.raise_for_status()
+                    file_path.write_bytes(r.content)
+                    stage.bytes_read = len(r.content)
             except requests.HTTPError as e:
                 logging.warning(f"Skipping {url}: {e}")
                 return None
@@ -69,12 +106,19 @@ class NYCTaxiDLTPipeline:
         results = []
         with ThreadPoolExecutor(max_workers=self.MAX_WORKERS) as executor:
             futures = {executor.submit(self._download_if_needed, m): m for m in months}
-            for future in tqdm(
-                as_completed(futures), total=len(futures), desc="Downloading files"
+            self.progress(stage="downloading", files_done=0, files_total=len(futures))
+            for done, future in enumerate(
+                tqdm(
+                    as_completed(futures), total=len(futures), desc="Downloading files"
+                ),
+                start=1,
             ):
                 path = future.result()
                 if path:
                     results.append(path)
+                self.progress(
+                    stage="downloading", files_done=done, files_total=len(futures)
+                )
         return results
 
     def _clean_data(self, df: pd.DataFrame) -> pd.DataFrame:
@@ -83,20 +127,63 @@ class NYCTaxiDLTPipeline:
         df.columns = [c.lower().replace(" ", "_") for c in df.columns]
         return df
 
+    def _iter_frames(self, file_path: Path) -> Iterator[pd.DataFrame]:
+        """Read a Parquet file as downcast DataFrames of `batch_sizer.size` rows."""
+        parquet_file = pq.ParquetFile(file_path)
+        pending, rows = [], 0
+        for batch in parquet_file.iter_batches(batch_size=self.BATCH_SIZE):
+            pending.append(batch)
+            rows += batch.num_rows
+            if rows >= self.batch_sizer.size:
+                yield downcast(pa.Table.from_batches(pending).to_pandas())
+                pending, rows = [], 0
+        if pending:
+            yield downcast(pa.Table.from_batches(pending).to_pandas())
+
     def get_resource(self):
         @dlt.resource(name="yellow_taxi_trips", write_disposition="append")
         def load_taxi_data() -> Iterator[Dict[str, Any]]:
             file_paths = self.download_all(self.months)
+            started = time.perf_counter()
+            self.progress(stage="extracting", files_done=0, files_total=len(file_paths))
 
-            for file_path in tqdm(file_paths, desc="Processing files"):
-                df = pd.read_parquet(file_path)
-                df = self._clean_data(df)
-                records = df.to_dict("records")
-
-                for record in records:
-                    yield record
-
-                del df, records
+            for done, file_path in enumerate(
+                tqdm(file_paths, desc="Processing files"), start=1
+            ):
+                with track_stage(
+                    "dlt_extract",
+                    item=file_path.name,
+                    rows_out=0,
+                    bytes_read=file_path.stat().st_size,
+                ) as stage:
+                    for df in self._iter_frames(file_path):
+                        rows, nbytes = len(df), frame_bytes(df)
+                        stage.rows_in += rows
+                        df = self._clean_data(df)
+                        if self.dedup_index is not None:
+                            hashes = trip_hashes(df, DLT_COLUMNS)
+                            new_rows = self.dedup_index.filter_new(hashes)
+                            self.rows_duplicate += int((~new_rows).sum())
+                            df = df[new_rows]
+                            self.dedup_index.reserve(hashes[new_rows])
+                        df = restore_floats(df.copy())
+                        stage.rows_out += len(df)
+
+                        for start in range(0, len(df), self.BATCH_SIZE):
+                            yield from df.iloc[
+                                start : start + self.BATCH_SIZE
+                            ].to_dict("records")
+                        self.batch_sizer.observe(rows, nbytes)
+
+                self.rows_extracted += stage.rows_out
+                self.progress(
+                    stage="extracting",
+                    files_done=done,
+                    files_total=len(file_paths),
+                    rows=self.rows_extracted,
+                    rows_per_sec=self.rows_extracted
+                    / max(time.perf_counter() - started, 1e-9),
+                )
                 gc.collect()
 
             tqdm._instances.clear()
@@ -104,6 +191,10 @@ class NYCTaxiDLTPipeline:
         return load_taxi_data
 
     def run_pipeline(self, destination="postgres"):
+        table = (
+            self.DEDUP_TABLES.get(destination) if isinstance(destination, str) else None
+        )
+        self.dedup_index = open_index(table) if table is not None else None
         pipeline = dlt.pipeline(
             pipeline_name="nyc_taxi_pipeline",
             destination=destination,
@@ -115,9 +206,23 @@ class NYCTaxiDLTPipeline:
         gen = resource()
 
         try:
-            load_info = pipeline.run(gen)
+            # Run the dlt steps one by one so each stage is reported
+            with run_report("dlt_pipeline"):
+                pipeline.extract(gen)
+                self.progress(stage="normalizing", rows=self.rows_extracted)
+                with track_stage("dlt_normalize", rows_in=self.rows_extracted):
+                    pipeline.normalize()
+                self.progress(stage="loading", rows=self.rows_extracted)
+                with track_stage("dlt_load", rows_in=self.rows_extracted):
+                    load_info = pipeline.load()
             logging.info(load_info)
+            if self.dedup_index is not None:
+                if not load_info.has_failed_jobs:
+                    self.dedup_index.commit()
+                logging.info(f"Skipped {self.rows_duplicate} already loaded trips")
         finally:
+            if self.dedup_index is not None:
+                self.dedup_index.rollback()
             if hasattr(gen, "close"):
                 gen.close()
             pipeline.close()
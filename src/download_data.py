@@ -2,7 +2,8 @@ import requests
 from pathlib import Path
 from datetime import datetime
 from tqdm import tqdm  # Pretty progress bar
-from import_to_duckdb import DuckDBImporter
+from src.import_to_duckdb import DuckDBImporter
+from src.metrics import run_report, track_stage
 
 
 class NYCTaxiDataDownloader:
@@ -40,27 +41,26 @@ class NYCTaxiDataDownloader:
         print(f"Downloading from {url}...")
 
         try:
-            with requests.get(url, stream=True, timeout=30) as response:
-                response.raise_for_status()
+            with track_stage("download", item=file_path.name) as stage:
+                with requests.get(url, stream=True, timeout=30) as response:
+                    response.raise_for_status()
 
-                total_size = int(response.headers.get("content-length", 0))
-                chunk_size = 8192
+                    total_size = int(response.headers.get("content-length", 0))
+                    chunk_size = 8192
 
-                with (
-                    open(file_path, "wb") as f,
-                    tqdm(
+                    with open(file_path, "wb") as f, tqdm(
                         total=total_size,
                         unit="B",
                         unit_scale=True,
                         desc=file_path.name,
                         ncols=80,
                         colour="green",
-                    ) as pbar,
-                ):
-                    for chunk in response.iter_content(chunk_size=chunk_size):
-                        if chunk:
-                            f.write(chunk)
-                            pbar.update(len(chunk))
+                    ) as pbar:
+                        for chunk in response.iter_content(chunk_size=chunk_size):
+                            if chunk:
+                                f.write(chunk)
+                                pbar.update(len(chunk))
+                                stage.bytes_read += len(chunk)
 
             print(f"Downloaded: {file_path.name}\n")
             return True
@@ -72,10 +72,14 @@ class NYCTaxiDataDownloader:
                 file_path.unlink()
             return False
 
+    def available_months(self) -> list:
+        """Months published so far for the configured year."""
+        now = datetime.now()
+        return list(range(1, now.month + 1) if self.YEAR == now.year else range(1, 13))
+
     def download_all_available(self) -> list:
         """Download all available months up to the current month."""
-        now = datetime.now()
-        months = range(1, now.month + 1) if self.YEAR == now.year else range(1, 13)
+        months = self.available_months()
 
         print(f"Downloading NYC Yellow Taxi data for {self.YEAR}...\n")
         downloaded_files = []
@@ -92,9 +96,15 @@ class NYCTaxiDataDownloader:
         return downloaded_files
 
 
-downloader = NYCTaxiDataDownloader(year=2025, data_dir="data/raw")
-downloader.download_all_available()
-importer = DuckDBImporter("yellow_taxi.duckdb")
-importer.import_all_parquet_files(Path("data/raw"))
-importer.get_statistics()
-importer.close()
+def main():
+    with run_report("download_and_import"):
+        downloader = NYCTaxiDataDownloader(year=2025, data_dir="data/raw")
+        downloader.download_all_available()
+        importer = DuckDBImporter("yellow_taxi.duckdb")
+        importer.import_all_parquet_files(Path("data/raw"))
+        importer.get_statistics()
+        importer.close()
+
+
+if __name__ == "__main__":
+    main()
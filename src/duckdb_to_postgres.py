@@ -1,13 +1,18 @@
 import os
-import duckdb
 import psycopg2
 import pandas as pd
 from io import StringIO
+from typing import Iterator, List, Optional
+from src.batching import AdaptiveBatchSizer, downcast, frame_bytes
+from src.dedup import DedupIndex, open_index, trip_hashes
+from src.import_to_duckdb import DuckDBImporter
+from src.metrics import run_report, track_stage
 
 # Config
 DUCKDB_FILE = os.getenv("DUCKDB_FILE", "yellow_taxi.duckdb")
 TABLE_NAME = os.getenv("TABLE_NAME", "yellow_taxi_trips")
-CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", 500_000))
+# Initial batch size; later batches are sized to fit MEMORY_BUDGET_MB
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", 50_000))
 
 PG_USER = os.getenv("POSTGRES_USER", "postgres")
 PG_PASSWORD = os.getenv("POSTGRES_PASSWORD", "postgres")
@@ -38,54 +43,57 @@ COLUMN_MAPPING = {
     "Airport_fee": "airport_fee",
 }
 
-# DuckDB connection
-con = duckdb.connect(DUCKDB_FILE)
+# Integer and timestamp columns after renaming
+INT_COLUMNS = [
+    "vendor_id",
+    "passenger_count",
+    "ratecode_id",
+    "pu_location_id",
+    "do_location_id",
+    "payment_type",
+]
+TIMESTAMP_COLUMNS = ["pickup_datetime", "dropoff_datetime"]
 
-# PostgreSQL connection
-pg_conn = psycopg2.connect(
-    dbname=PG_DB, user=PG_USER, password=PG_PASSWORD, host=PG_HOST, port=PG_PORT
-)
 
-# Fetch total number of rows
-total_rows = con.execute("SELECT COUNT(*) FROM yellow_taxi_trips").fetchone()[0]
-print(f"Total rows in DuckDB: {total_rows}")
+def connect_postgres():
+    return psycopg2.connect(
+        dbname=PG_DB, user=PG_USER, password=PG_PASSWORD, host=PG_HOST, port=PG_PORT
+    )
 
-# Batch export
-offset = 0
-while offset < total_rows:
-    df = con.execute(f"""
-        SELECT * FROM yellow_taxi_trips
-        LIMIT {CHUNK_SIZE} OFFSET {offset}
-    """).df()
 
-    # Rename columns
+def prepare_batch(df: pd.DataFrame) -> pd.DataFrame:
+    """Rename DuckDB columns to the Postgres schema, cast and downcast them."""
     df.rename(columns=COLUMN_MAPPING, inplace=True)
-
-    # Cast integers
-    int_cols = [
-        "vendor_id",
-        "passenger_count",
-        "ratecode_id",
-        "pu_location_id",
-        "do_location_id",
-        "payment_type",
-    ]
-    for col in int_cols:
+    for col in INT_COLUMNS:
         if col in df.columns:
             df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0).astype(int)
-
-    # Cast timestamps
-    ts_cols = ["pickup_datetime", "dropoff_datetime"]
-    for col in ts_cols:
+    for col in TIMESTAMP_COLUMNS:
         if col in df.columns:
             df[col] = pd.to_datetime(df[col], errors="coerce")
+    return downcast(df)
+
 
-    # CSV buffer for COPY
+def allocate_ids(pg_conn, rows: int) -> List[int]:
+    """Draw `rows` ids from the trips id sequence (in the open transaction)."""
+    with pg_conn.cursor() as cur:
+        cur.execute(
+            "SELECT nextval(pg_get_serial_sequence(%s, 'id')) "
+            "FROM generate_series(1, %s)",
+            (TABLE_NAME, rows),
+        )
+        return [row[0] for row in cur.fetchall()]
+
+
+def copy_batch(pg_conn, df: pd.DataFrame):
+    """COPY a prepared batch into Postgres and commit."""
     csv_buffer = StringIO()
-    df.to_csv(csv_buffer, index=False, header=False, date_format="%Y-%m-%d %H:%M:%S")
+    df.to_csv(
+        csv_buffer,
+        index=False,
+        header=False,
+        date_format="%Y-%m-%d %H:%M:%S",
+    )
     csv_buffer.seek(0)
-
-    # COPY into PostgreSQL
     with pg_conn.cursor() as cur:
         columns = df.columns.tolist()
         cur.copy_expert(
@@ -94,9 +102,82 @@ while offset < total_rows:
         )
         pg_conn.commit()
 
-    print(f"Inserted rows {offset + 1} to {offset + len(df)}")
-    offset += CHUNK_SIZE
 
-pg_conn.close()
-con.close()
-print("DuckDB -> PostgreSQL export complete!")
+def export_rows(
+    con,
+    pg_conn,
+    dedup_index: DedupIndex,
+    first_id: int,
+    last_id: int,
+    sizer: Optional[AdaptiveBatchSizer] = None,
+    item: str = "rows",
+) -> Iterator[pd.DataFrame]:
+    """
+    Export DuckDB trips with ingest ids `first_id`..`last_id` (inclusive)
+    in batches. Each batch's new rows, with the `id` they were given in
+    Postgres, are yielded once committed to Postgres and to the dedup index,
+    which may be shared by several exporting threads.
+    """
+    # The frame, its CSV buffer and the buffer's string are alive together
+    sizer = sizer or AdaptiveBatchSizer(initial=CHUNK_SIZE, copies=3)
+    start = first_id
+    while start <= last_id:
+        end = min(start + sizer.size, last_id + 1)
+        with track_stage("postgres_export", item=f"{item} {start}-{end - 1}") as stage:
+            # Ingest id ranges read only the batch, unlike an ever-growing OFFSET
+            df = con.execute(
+                "SELECT * EXCLUDE (ingest_id) FROM yellow_taxi_trips"
+                " WHERE ingest_id >= ? AND ingest_id < ? ORDER BY ingest_id",
+                [start, end],
+            ).df()
+            stage.rows_in = len(df)
+            df = prepare_batch(df)
+            stage.bytes_read = frame_bytes(df)
+
+            # Drop trips already in Postgres (or repeated within this run)
+            hashes = trip_hashes(df)
+            new_rows, reservation = dedup_index.claim(hashes)
+            df = df[new_rows]
+            stage.rows_out = len(df)
+
+            try:
+                # Ids are drawn upfront so the batch matches the stored rows
+                df.insert(0, "id", allocate_ids(pg_conn, len(df)) if len(df) else [])
+                copy_batch(pg_conn, df)
+            except BaseException:
+                pg_conn.rollback()
+                dedup_index.rollback(reservation)
+                raise
+            dedup_index.commit(reservation)
+            sizer.observe(stage.rows_in, stage.bytes_read)
+
+        print(f"Inserted {len(df)} new rows from ingest ids {start} to {end - 1}")
+        yield df
+        start = end
+
+
+def main():
+    # Hashes of trips already exported, so re-runs do not duplicate rows
+    dedup_index = open_index(TABLE_NAME)
+    # Opened through the importer, which adds ingest ids to older databases
+    importer = DuckDBImporter(DUCKDB_FILE)
+    pg_conn = connect_postgres()
+
+    total_rows = importer.conn.execute(
+        "SELECT COUNT(*) FROM yellow_taxi_trips"
+    ).fetchone()[0]
+    print(f"Total rows in DuckDB: {total_rows}")
+
+    with run_report("duckdb_to_postgres"):
+        ingest_ids = importer.ingest_id_range()
+        if ingest_ids:
+            for _ in export_rows(importer.conn, pg_conn, dedup_index, *ingest_ids):
+                pass
+
+    pg_conn.close()
+    importer.close()
+    print("DuckDB -> PostgreSQL export complete!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+import io
+import os
+from functools import lru_cache
+from typing import AsyncIterator, List, Sequence
+
+import orjson
+from sqlalchemy import BigInteger, DateTime, Float, Integer, select
+from starlette.concurrency import run_in_threadpool
+
+from src.database import async_engine
+from src.services import ROW_COLUMN_NAMES, ROW_COLUMNS
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "50000"))
+
+NDJSON = "application/x-ndjson"
+ARROW = "application/vnd.apache.arrow.stream"
+ARROW_FILE = "application/vnd.apache.arrow.file"
+PARQUET = "application/vnd.apache.parquet"
+
+# Accept header values -> canonical export format
+MEDIA_TYPES = {
+    NDJSON: NDJSON,
+    "application/json": NDJSON,
+    ARROW: ARROW,
+    ARROW_FILE: ARROW_FILE,
+    PARQUET: PARQUET,
+    "application/x-parquet": PARQUET,
+}
+
+
+def _arrow_type(column):
+    import pyarrow as pa
+
+    if isinstance(column.type, BigInteger):
+        return pa.int64()
+    if isinstance(column.type, Integer):
+        return pa.int32()
+    if isinstance(column.type, Float):
+        return pa.float64()
+    if isinstance(column.type, DateTime):
+        return pa.timestamp("us")
+    return pa.string()
+
+
+@lru_cache(maxsize=None)
+def arrow_schema():
+    """Arrow schema of exported rows; pyarrow is only imported on first use."""
+    import pyarrow as pa
+
+    return pa.schema([(c.name, _arrow_type(c)) for c in ROW_COLUMNS])
+
+
+def negotiate_format(accept: str) -> str:
+    """Pick the export format from an Accept header (NDJSON by default)."""
+    for part in (accept or "").split(","):
+        media_type = part.split(";")[0].strip().lower()
+        if media_type in MEDIA_TYPES:
+            return MEDIA_TYPES[media_type]
+    return NDJSON
+
+
+class _ChunkSink(io.RawIOBase):
+    """
+    Write-only file object that buffers bytes until drained, while keeping
+    `tell()` consistent so Arrow/Parquet writers can compute file offsets.
+    """
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class NDJSONEncoder:
+    def encode(self, rows: Sequence[tuple]) -> bytes:
+        lines = [orjson.dumps(dict(zip(ROW_COLUMN_NAMES, row))) for row in rows]
+        lines.append(b"")
+        return b"\n".join(lines)
+
+    def close(self) -> bytes:
+        return b""
+
+
+class ArrowEncoder:
+    """
+    Encodes row batches as an Arrow IPC stream, an Arrow IPC file (footer
+    written on close) or Parquet row groups.
+    """
+
+    def __init__(self, export_format: str = ARROW):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self._pa = pa
+        self._schema = arrow_schema()
+        self._sink = _ChunkSink()
+        if export_format == PARQUET:
+            self._writer = pq.ParquetWriter(self._sink, self._schema)
+        elif export_format == ARROW_FILE:
+            self._writer = pa.ipc.new_file(self._sink, self._schema)
+        else:
+            self._writer = pa.ipc.new_stream(self._sink, self._schema)
+
+    def encode(self, rows: Sequence[tuple]) -> bytes:
+        pa = self._pa
+        columns = list(zip(*rows))
+        batch = pa.record_batch(
+            [
+                pa.array(values, type=field.type)
+                for values, field in zip(columns, self._schema)
+            ],
+            schema=self._schema,
+        )
+        self._writer.write_batch(batch)
+        return self._sink.drain()
+
+    def close(self) -> bytes:
+        self._writer.close()
+        return self._sink.drain()
+
+
+def make_encoder(export_format: str):
+    if export_format in (ARROW, ARROW_FILE, PARQUET):
+        return ArrowEncoder(export_format)
+    return NDJSONEncoder()
+
+
+async def stream_trips(conditions: list, export_format: str) -> AsyncIterator[bytes]:
+    """
+    Stream matching trips through a server-side cursor, encoding one batch at
+    a time so memory stays bounded regardless of the result size.
+    """
+    encoder = make_encoder(export_format)
+    stmt = (
+        select(*ROW_COLUMNS)
+        .where(*conditions)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+    async with async_engine.connect() as conn:
+        result = await conn.stream(stmt)
+        async for rows in result.partitions(EXPORT_BATCH_SIZE):
+            yield await run_in_threadpool(encoder.encode, rows)
+    tail = encoder.close()
+    if tail:
+        yield tail
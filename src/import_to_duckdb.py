@@ -2,6 +2,9 @@ import duckdb
 from pathlib import Path
 from datetime import datetime
 import os
+from typing import Optional, Tuple
+from src import analytics, od_matrix
+from src.metrics import track_stage
 
 
 class DuckDBImporter:
@@ -9,6 +12,7 @@ class DuckDBImporter:
         """Initialize DuckDB connection and create tables if needed."""
         self.db_path = db_path
         self.conn = duckdb.connect(db_path)
+        self.imported = 0
         self._initialize_database()
 
     def _initialize_database(self):
@@ -46,6 +50,25 @@ class DuckDBImporter:
                 rows_imported BIGINT
             )
         """)
+        # Every trip gets an ingest id from a sequence, so a file's rows
+        # occupy one id range, logged with the file; the orchestrator exports
+        # each file by that range (rowids are not stable across deletes)
+        self.conn.execute("CREATE SEQUENCE IF NOT EXISTS trip_ingest_id START 1")
+        self.conn.execute(
+            "ALTER TABLE yellow_taxi_trips ADD COLUMN IF NOT EXISTS ingest_id BIGINT"
+        )
+        self.conn.execute(
+            "ALTER TABLE import_log ADD COLUMN IF NOT EXISTS first_ingest_id BIGINT"
+        )
+        self.conn.execute(
+            "ALTER TABLE import_log ADD COLUMN IF NOT EXISTS last_ingest_id BIGINT"
+        )
+        # Trips imported before ingest ids existed; their files have no
+        # logged range and are exported with the whole table instead
+        self.conn.execute(
+            "UPDATE yellow_taxi_trips SET ingest_id = nextval('trip_ingest_id') "
+            "WHERE ingest_id IS NULL"
+        )
 
     def is_file_imported(self, filename: str) -> bool:
         """Check if a given file has already been imported."""
@@ -54,18 +77,40 @@ class DuckDBImporter:
         ).fetchone()
         return result[0] > 0
 
+    def file_ingest_ids(self, filename: str) -> Optional[Tuple[int, int]]:
+        """
+        Inclusive ingest id range of an imported file (empty for an empty file),
+        or None if it was imported before ingest ids were logged.
+        """
+        result = self.conn.execute(
+            "SELECT first_ingest_id, last_ingest_id FROM import_log "
+            "WHERE file_name = ?",
+            [filename],
+        ).fetchone()
+        if result is None or result[0] is None:
+            return None
+        return result[0], result[1]
+
+    def ingest_id_range(self) -> Optional[Tuple[int, int]]:
+        """Inclusive ingest id range of the whole trips table (None if empty)."""
+        result = self.conn.execute(
+            "SELECT MIN(ingest_id), MAX(ingest_id) FROM yellow_taxi_trips"
+        ).fetchone()
+        return None if result[0] is None else (result[0], result[1])
+
     def import_parquet(self, file_path: Path) -> bool:
         """Import a Parquet file into the yellow_taxi_trips table (auto-aligns columns)."""
         filename = file_path.name
 
         if self.is_file_imported(filename):
             print(f"✅ {filename} already imported, skipping.")
+            self.update_od_matrix(file_path)
             return True
 
         try:
-            before_count = self.conn.execute(
-                "SELECT COUNT(*) FROM yellow_taxi_trips"
-            ).fetchone()[0]
+            before_count, last_ingest_id = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(MAX(ingest_id), 0) FROM yellow_taxi_trips"
+            ).fetchone()
 
             # Dynamically detect common columns
             table_cols = [
@@ -80,7 +125,9 @@ class DuckDBImporter:
                     f"SELECT * FROM read_parquet('{file_path}') LIMIT 0"
                 ).description
             ]
-            common_cols = [c for c in parquet_cols if c in table_cols]
+            common_cols = [
+                c for c in parquet_cols if c in table_cols and c != "ingest_id"
+            ]
 
             if not common_cols:
                 raise ValueError(
@@ -90,31 +137,63 @@ class DuckDBImporter:
             col_list = ", ".join(common_cols)
 
             print(f"Importing {filename} ({len(common_cols)} matching columns)...")
-            self.conn.execute(f"""
-                INSERT INTO yellow_taxi_trips ({col_list})
-                SELECT {col_list} FROM read_parquet('{file_path}')
-            """)
-
-            after_count = self.conn.execute(
-                "SELECT COUNT(*) FROM yellow_taxi_trips"
-            ).fetchone()[0]
-            rows_imported = after_count - before_count
+            with track_stage(
+                "duckdb_import", item=filename, bytes_read=file_path.stat().st_size
+            ) as stage:
+                self.conn.execute(f"""
+                    INSERT INTO yellow_taxi_trips ({col_list}, ingest_id)
+                    SELECT {col_list}, nextval('trip_ingest_id')
+                    FROM read_parquet('{file_path}')
+                """)
+
+                after_count, max_ingest_id = self.conn.execute(
+                    "SELECT COUNT(*), COALESCE(MAX(ingest_id), 0) FROM yellow_taxi_trips"
+                ).fetchone()
+                rows_imported = after_count - before_count
+                stage.rows_in = rows_imported
 
             self.conn.execute(
                 """
-                INSERT INTO import_log (file_name, import_date, rows_imported)
-                VALUES (?, ?, ?)
+                INSERT INTO import_log (
+                    file_name,
+                    import_date,
+                    rows_imported,
+                    first_ingest_id,
+                    last_ingest_id
+                )
+                VALUES (?, ?, ?, ?, ?)
             """,
-                [filename, datetime.now(), rows_imported],
+                [
+                    filename,
+                    datetime.now(),
+                    rows_imported,
+                    last_ingest_id + 1,
+                    max_ingest_id,
+                ],
             )
 
             print(f"{filename} imported successfully ({rows_imported} rows).")
-            return True
+            self.imported += 1
 
         except Exception as e:
             print(f"Error importing {filename}: {e}")
             return False
 
+        self.update_od_matrix(file_path)
+        return True
+
+    def update_od_matrix(self, file_path: Path):
+        """Add a file to the OD cube (no-op if it is already included)."""
+        try:
+            with track_stage("od_matrix", item=file_path.name):
+                added = od_matrix.update_from_parquet(self.conn, file_path)
+        except Exception as e:
+            # The trips are imported; `python -m src.od_matrix` can rebuild later
+            print(f"Error updating OD matrix with {file_path.name}: {e}")
+            return
+        if added:
+            print(f"OD matrix updated with {file_path.name}.")
+
     def import_all_parquet_files(self, data_dir: Path) -> int:
         """Import all Parquet files from the specified directory."""
         parquet_files = sorted(data_dir.glob("*.parquet"))
@@ -155,8 +234,17 @@ class DuckDBImporter:
         print(f" - Pickup date range  : {date_range[0]} → {date_range[1]}")
         print(f" - Database size      : {db_size_mb:.2f} MB")
 
+    def publish_snapshot(self):
+        """Publish the read-only copy served by the analytics endpoints."""
+        with track_stage("analytics_snapshot", item=Path(self.db_path).name):
+            path = analytics.publish_snapshot(self.conn, self.db_path)
+        print(f"Analytics snapshot published to {path}.")
+
     def close(self):
-        """Close the DuckDB connection."""
+        """Publish a new analytics snapshot if files were imported, then close."""
         if self.conn:
+            if self.imported:
+                self.publish_snapshot()
+                self.imported = 0
             self.conn.close()
             print("🔒 DuckDB connection closed.")
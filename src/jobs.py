@@ -0,0 +1,312 @@
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from src.database import SessionLocal
+from src.metrics import add_stage_listener, observe_stage
+from src.models import ImportLog
+
+PIPELINE_MAX_CONCURRENCY = int(os.getenv("PIPELINE_MAX_CONCURRENCY", "1"))
+PROGRESS_INTERVAL = float(os.getenv("PIPELINE_PROGRESS_INTERVAL", "1.0"))
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+def params_key(params: Dict[str, Any]) -> str:
+    """Canonical key used to deduplicate identical pipeline requests."""
+    return json.dumps(params, sort_keys=True)
+
+
+class ImportLogProgress:
+    """
+    Progress callback for `NYCTaxiDLTPipeline` that writes the current stage,
+    file counts and throughput into the run's ImportLog row. Writes are
+    throttled to one every `PROGRESS_INTERVAL` seconds unless the stage changes.
+    """
+
+    def __init__(self, session, log_id: int):
+        self.session = session
+        self.log_id = log_id
+        self._stage = None
+        self._last_write = 0.0
+
+    def __call__(self, stage: str, **progress):
+        now = time.monotonic()
+        if stage == self._stage and now - self._last_write < PROGRESS_INTERVAL:
+            return
+        self._stage, self._last_write = stage, now
+
+        values = {"stage": stage, "updated_at": datetime.utcnow()}
+        for field in ("files_done", "files_total", "rows_per_sec"):
+            if field in progress:
+                values[field] = progress[field]
+        if "rows" in progress:
+            values["rows_imported"] = progress["rows"]
+        self.session.query(ImportLog).filter(ImportLog.id == self.log_id).update(
+            values, synchronize_session=False
+        )
+        self.session.commit()
+
+
+def _update_log(session, log_id: int, **values):
+    session.query(ImportLog).filter(ImportLog.id == log_id).update(
+        values, synchronize_session=False
+    )
+    session.commit()
+
+
+class JobCancelled(BaseException):
+    """
+    Raised in a worker process on SIGTERM. Like KeyboardInterrupt it is not
+    an Exception, so the job unwinds without being logged as failed.
+    """
+
+
+def _cancel_on_sigterm(signum, frame):
+    raise JobCancelled()
+
+
+def run_job(log_id: int, params: Dict[str, Any], stage_queue=None):
+    """
+    Entry point of a pipeline worker process. Heavy pipeline modules are
+    imported here so the API process never loads them. Stage metrics are
+    sent back to the API process through `stage_queue`. A cancelled job
+    receives SIGTERM and exits cleanly, letting the queue flush its buffer.
+    """
+    signal.signal(signal.SIGTERM, _cancel_on_sigterm)
+
+    from src.dlt_pipeline import NYCTaxiDLTPipeline
+    from src.services import TaxiTripService
+
+    if stage_queue is not None:
+        add_stage_listener(stage_queue.put)
+
+    session = SessionLocal()
+    try:
+        _update_log(
+            session,
+            log_id,
+            status="running",
+            message="Pipeline running...",
+            updated_at=datetime.utcnow(),
+        )
+        pipeline = NYCTaxiDLTPipeline(progress=ImportLogProgress(session, log_id))
+        load_info = pipeline.run_pipeline(destination=params["destination"])
+
+        # Rebuild the statistics summary now that new trips are loaded
+        TaxiTripService.refresh_statistics(session)
+
+        _update_log(
+            session,
+            log_id,
+            status="completed",
+            stage="completed",
+            rows_imported=pipeline.rows_extracted,
+            message=str(load_info)[:5000],
+            completed_at=datetime.utcnow(),
+            updated_at=datetime.utcnow(),
+        )
+    except Exception as e:
+        logging.error("Pipeline execution failed", exc_info=True)
+        session.rollback()
+        _update_log(
+            session,
+            log_id,
+            status="failed",
+            message=f"{type(e).__name__}: {str(e)}\n{traceback.format_exc()[:4000]}",
+            completed_at=datetime.utcnow(),
+            updated_at=datetime.utcnow(),
+        )
+        raise
+    finally:
+        session.close()
+
+
+class PipelineJobRunner:
+    """
+    Runs pipeline jobs in separate worker processes, at most
+    `max_concurrency` at a time, with a FIFO queue for the rest.
+    Identical requests are deduplicated against this runner's queued and
+    running jobs, and any job can be cancelled. Job state and progress live
+    in ImportLog so every API worker can read them; the API should run a
+    single uvicorn worker for the concurrency limit to hold globally.
+    """
+
+    def __init__(self, max_concurrency: int = PIPELINE_MAX_CONCURRENCY):
+        self.max_concurrency = max_concurrency
+        self._context = multiprocessing.get_context("spawn")
+        # One stage-metrics queue per job, so a worker killed mid-write can
+        # only break its own
+        self._stage_queues: Dict[int, Any] = {}
+        self._pending: Deque[Tuple[int, Dict[str, Any]]] = deque()
+        self._running: Dict[int, multiprocessing.Process] = {}
+        self._lock = threading.Condition()
+        self._dispatcher: Optional[threading.Thread] = None
+        self._stopped = False
+
+    def submit(self, params: Dict[str, Any]) -> ImportLog:
+        """Queue a run, or return the active run with the same parameters."""
+        key = params_key(params)
+        with self._lock, SessionLocal() as session:
+            active_ids = list(self._running) + [job_id for job_id, _ in self._pending]
+            active = (
+                session.query(ImportLog)
+                .filter(
+                    ImportLog.id.in_(active_ids),
+                    ImportLog.params_key == key,
+                    ImportLog.status.in_(ACTIVE_STATUSES),
+                )
+                .order_by(ImportLog.id)
+                .first()
+            )
+            if active is not None:
+                return active
+
+            import_date = datetime.utcnow()
+            log = ImportLog(
+                file_name=f"nyc_taxi_pipeline_{import_date:%Y%m%d_%H%M%S}",
+                import_date=import_date,
+                rows_imported=0,
+                status="queued",
+                stage="queued",
+                message="Waiting for a free pipeline slot...",
+                params_key=key,
+                updated_at=import_date,
+            )
+            session.add(log)
+            session.commit()
+            session.refresh(log)
+
+            self._pending.append((log.id, params))
+            self._ensure_dispatcher()
+            self._lock.notify()
+            return log
+
+    def cancel(self, log_id: int) -> bool:
+        """Cancel a queued or running job; returns False if it is not active."""
+        with self._lock:
+            process = self._running.pop(log_id, None)
+            queued = any(job_id == log_id for job_id, _ in self._pending)
+            if queued:
+                self._pending = deque(j for j in self._pending if j[0] != log_id)
+            stage_queue = self._stage_queues.pop(log_id, None)
+
+        # Outside the lock, so submissions and the dispatcher are not held up
+        # for as long as the worker takes to exit. SIGTERM makes it unwind
+        # (see `run_job`); its metrics queue is discarded unread either way.
+        if process is not None:
+            process.terminate()
+            process.join(timeout=10)
+        if stage_queue is not None:
+            stage_queue.close()
+            stage_queue.cancel_join_thread()
+        with self._lock:
+            self._lock.notify()
+
+        with SessionLocal() as session:
+            updated = (
+                session.query(ImportLog)
+                .filter(
+                    ImportLog.id == log_id, ImportLog.status.in_(ACTIVE_STATUSES)
+                )
+                .update(
+                    {
+                        "status": "cancelled",
+                        "message": "Cancelled by request.",
+                        "completed_at": datetime.utcnow(),
+                        "updated_at": datetime.utcnow(),
+                    },
+                    synchronize_session=False,
+                )
+            )
+            session.commit()
+        return bool(updated or queued or process is not None)
+
+    def shutdown(self):
+        """Stop dispatching and cancel every queued or running job."""
+        with self._lock:
+            self._stopped = True
+            job_ids = list(self._running) + [job_id for job_id, _ in self._pending]
+            self._lock.notify()
+        for job_id in job_ids:
+            self.cancel(job_id)
+
+    def _ensure_dispatcher(self):
+        if self._dispatcher is None or not self._dispatcher.is_alive():
+            self._dispatcher = threading.Thread(
+                target=self._dispatch, name="pipeline-dispatcher", daemon=True
+            )
+            self._dispatcher.start()
+
+    def _dispatch(self):
+        while True:
+            with self._lock:
+                if self._stopped:
+                    return
+                self._drain_stage_metrics()
+                self._reap()
+                while self._pending and len(self._running) < self.max_concurrency:
+                    log_id, params = self._pending.popleft()
+                    stage_queue = self._context.Queue()
+                    process = self._context.Process(
+                        target=run_job,
+                        args=(log_id, params, stage_queue),
+                        name=f"pipeline-{log_id}",
+                    )
+                    process.start()
+                    self._running[log_id] = process
+                    self._stage_queues[log_id] = stage_queue
+                self._lock.wait(timeout=1.0)
+
+    def _drain_stage_metrics(self, log_ids: Optional[List[int]] = None):
+        """Record the stage metrics reported by (some of) the worker processes."""
+        for log_id in self._stage_queues if log_ids is None else log_ids:
+            stage_queue = self._stage_queues[log_id]
+            while True:
+                try:
+                    observe_stage(stage_queue.get_nowait())
+                except queue.Empty:
+                    break
+
+    def _reap(self):
+        """Forget finished workers and flag crashed ones as failed."""
+        from src.services import statistics_cache
+
+        for log_id, process in list(self._running.items()):
+            if process.is_alive():
+                continue
+            del self._running[log_id]
+            # A worker that exited cleanly has flushed its queue: read the rest.
+            # A crashed one may have left a partial message, so it is dropped.
+            if process.exitcode == 0:
+                self._drain_stage_metrics([log_id])
+            stage_queue = self._stage_queues.pop(log_id)
+            stage_queue.close()
+            stage_queue.cancel_join_thread()
+            statistics_cache.invalidate()
+            if process.exitcode == 0:
+                continue
+            with SessionLocal() as session:
+                session.query(ImportLog).filter(
+                    ImportLog.id == log_id, ImportLog.status.in_(ACTIVE_STATUSES)
+                ).update(
+                    {
+                        "status": "failed",
+                        "message": f"Worker exited with code {process.exitcode}",
+                        "completed_at": datetime.utcnow(),
+                    },
+                    synchronize_session=False,
+                )
+                session.commit()
+
+
+runner = PipelineJobRunner()
@@ -1,11 +1,18 @@
-from fastapi import FastAPI
+import time
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from src.database import engine, Base
+from fastapi.responses import JSONResponse, PlainTextResponse
+from sqlalchemy.exc import SQLAlchemyError
+from src.database import engine, async_engine, check_schema
+from src.metrics import REGISTRY, instrument_pool
 from src.routers.trips import router
-from src.database import init_db
+from src.routers.analytics import router as analytics_router
+from src.analytics import analytics_cache, pool as analytics_pool
+from src.services import statistics_cache, trip_cache
+from src.jobs import runner as pipeline_runner
 
-# Create database tables (if they don’t already exist)
-Base.metadata.create_all(bind=engine)
+# The schema is created by `python -m src.migrate`, never at import or
+# startup: importing the app must stay cheap and must not need Postgres.
 
 # FastAPI application configuration
 app = FastAPI(
@@ -24,9 +31,33 @@ app.add_middleware(
 )
 
 
-@app.on_event("startup")
-def on_startup():
-    init_db()
+REQUEST_LATENCY = REGISTRY.histogram(
+    "http_request_duration_seconds",
+    "Latency of API requests by route.",
+    ("method", "route", "status"),
+)
+instrument_pool("sync", engine.pool)
+instrument_pool("async", async_engine.pool)
+
+
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    REQUEST_LATENCY.observe(
+        time.perf_counter() - started,
+        method=request.method,
+        route=getattr(route, "path", "unmatched"),
+        status=response.status_code,
+    )
+    return response
+
+
+@app.on_event("shutdown")
+def on_shutdown():
+    analytics_pool.close()
+    pipeline_runner.shutdown()
 
 
 # Main routes
@@ -40,8 +71,45 @@ def health_check():
     return {"status": "ok"}
 
 
+@app.get("/ready", tags=["Health"])
+async def readiness_check():
+    """Ready once Postgres answers and the schema is up to date."""
+    try:
+        missing = await check_schema()
+    except (OSError, SQLAlchemyError) as e:
+        return JSONResponse(
+            status_code=503,
+            content={"status": "unavailable", "detail": type(e).__name__},
+        )
+    if missing:
+        return JSONResponse(
+            status_code=503,
+            content={"status": "migration_required", "missing": missing},
+        )
+    return {"status": "ready"}
+
+
+@app.get("/metrics", tags=["Health"], response_class=PlainTextResponse)
+def metrics():
+    """Prometheus metrics: request latency, DB pools and pipeline stages."""
+    return PlainTextResponse(
+        REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+@app.get("/cache/stats", tags=["Health"])
+def cache_stats():
+    """Size and hit/miss/eviction counters of the in-process caches."""
+    return {
+        "trips": trip_cache.stats(),
+        "statistics": statistics_cache.stats(),
+        "analytics": analytics_cache.stats(),
+    }
+
+
 # Include main router
 app.include_router(router, prefix="/api/v1")
+app.include_router(analytics_router, prefix="/api/v1")
 
 #TODO: delete this
 #ruleset-test2
\ No newline at end of file
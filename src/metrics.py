@@ -0,0 +1,397 @@
+import json
+import os
+import resource
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+# Directory where JSON run reports are written (disabled when unset)
+METRICS_REPORT_DIR = os.getenv("METRICS_REPORT_DIR")
+
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+STAGE_BUCKETS = (0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0)
+
+
+def peak_rss_bytes() -> int:
+    """Peak resident set size of this process (ru_maxrss is in KiB on Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def current_rss_bytes() -> int:
+    """Current resident set size, falling back to the peak off Linux."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except (OSError, IndexError, ValueError):
+        return peak_rss_bytes()
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    if not labelnames:
+        return ""
+    pairs = ",".join(
+        f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)
+    )
+    return "{" + pairs + "}"
+
+
+class Metric:
+    type = "untyped"
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield self.name, _format_labels(self.labelnames, key), value
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        for name, labels, value in self.samples():
+            lines.append(f"{name}{labels} {value}")
+        return lines
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total, count = self._values.get(
+                key, ([0] * len(self.buckets), 0.0, 0)
+            )
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value, count + 1)
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        with self._lock:
+            values = [(key, (list(c), t, n)) for key, (c, t, n) in self._values.items()]
+        bucket_labels = self.labelnames + ("le",)
+        for key, (counts, total, count) in values:
+            for bound, bucket_count in zip(self.buckets, counts):
+                yield (
+                    f"{self.name}_bucket",
+                    _format_labels(bucket_labels, key + (str(bound),)),
+                    bucket_count,
+                )
+            yield (
+                f"{self.name}_bucket",
+                _format_labels(bucket_labels, key + ("+Inf",)),
+                count,
+            )
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, count
+
+
+class MetricsRegistry:
+    """
+    Minimal in-process metrics registry rendered in the Prometheus text
+    format. Collectors are callables run at scrape time to refresh gauges
+    (connection pools, RSS) just before rendering.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric: Metric) -> Metric:
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, documentation: str, labelnames=()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames=()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector: Callable[[], None]):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self._collectors:
+            collector()
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_DURATION = REGISTRY.histogram(
+    "pipeline_stage_duration_seconds",
+    "Duration of a pipeline stage for one file or batch.",
+    ("stage", "status"),
+    STAGE_BUCKETS,
+)
+STAGE_RUNS = REGISTRY.counter(
+    "pipeline_stage_runs_total",
+    "Files or batches processed by a pipeline stage, by outcome.",
+    ("stage", "status", "error"),
+)
+STAGE_ROWS_IN = REGISTRY.counter(
+    "pipeline_stage_rows_in_total", "Rows read by a pipeline stage.", ("stage",)
+)
+STAGE_ROWS_OUT = REGISTRY.counter(
+    "pipeline_stage_rows_out_total", "Rows written by a pipeline stage.", ("stage",)
+)
+STAGE_BYTES_READ = REGISTRY.counter(
+    "pipeline_stage_bytes_read_total", "Bytes read by a pipeline stage.", ("stage",)
+)
+STAGE_ROWS_PER_SEC = REGISTRY.gauge(
+    "pipeline_stage_rows_per_second",
+    "Throughput of the last file or batch processed by a stage.",
+    ("stage",),
+)
+STAGE_PEAK_RSS = REGISTRY.gauge(
+    "pipeline_stage_peak_rss_bytes",
+    "Peak RSS of the process that ran the last file or batch of a stage.",
+    ("stage",),
+)
+PROCESS_PEAK_RSS = REGISTRY.gauge(
+    "process_peak_rss_bytes", "Peak resident set size of this process."
+)
+REGISTRY.add_collector(lambda: PROCESS_PEAK_RSS.set(peak_rss_bytes()))
+
+DB_POOL_SIZE = REGISTRY.gauge(
+    "db_pool_size", "Configured size of a SQLAlchemy connection pool.", ("engine",)
+)
+DB_POOL_CHECKED_OUT = REGISTRY.gauge(
+    "db_pool_checked_out", "Connections currently checked out.", ("engine",)
+)
+DB_POOL_CHECKED_IN = REGISTRY.gauge(
+    "db_pool_checked_in", "Idle connections held by the pool.", ("engine",)
+)
+DB_POOL_OVERFLOW = REGISTRY.gauge(
+    "db_pool_overflow", "Connections opened beyond the pool size.", ("engine",)
+)
+
+
+def instrument_pool(name: str, pool):
+    """Export the stats of a SQLAlchemy QueuePool at every scrape."""
+
+    def collect():
+        DB_POOL_SIZE.set(pool.size(), engine=name)
+        DB_POOL_CHECKED_OUT.set(pool.checkedout(), engine=name)
+        DB_POOL_CHECKED_IN.set(pool.checkedin(), engine=name)
+        DB_POOL_OVERFLOW.set(pool.overflow(), engine=name)
+
+    REGISTRY.add_collector(collect)
+
+
+class RunReport:
+    """Per-run collection of stage records, optionally dumped as JSON."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started_at = datetime.utcnow()
+        self.finished_at: Optional[datetime] = None
+        self.stages: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def add(self, record: Dict[str, Any]):
+        with self._lock:
+            self.stages.append(record)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Totals per stage: duration, rows in/out, bytes read, errors, rows/sec."""
+        totals: Dict[str, Dict[str, float]] = {}
+        for record in self.stages:
+            stage = totals.setdefault(
+                record["stage"],
+                {
+                    "duration_s": 0.0,
+                    "rows_in": 0,
+                    "rows_out": 0,
+                    "bytes_read": 0,
+                    "errors": 0,
+                },
+            )
+            for field in ("duration_s", "rows_in", "rows_out", "bytes_read"):
+                stage[field] += record[field]
+            stage["errors"] += record["status"] == "error"
+        for stage in totals.values():
+            stage["rows_per_sec"] = stage["rows_out"] / max(stage["duration_s"], 1e-9)
+        return totals
+
+    def write(self, directory: str) -> Path:
+        path = Path(directory)
+        path.mkdir(parents=True, exist_ok=True)
+        path = path / f"{self.name}_{self.started_at:%Y%m%d_%H%M%S}.json"
+        report = {
+            "name": self.name,
+            "started_at": self.started_at.isoformat(),
+            "finished_at": (self.finished_at or datetime.utcnow()).isoformat(),
+            "peak_rss_bytes": peak_rss_bytes(),
+            "summary": self.summary(),
+            "stages": self.stages,
+        }
+        path.write_text(json.dumps(report, indent=2))
+        return path
+
+
+_current_report: Optional[RunReport] = None
+_stage_listeners: List[Callable[[Dict[str, Any]], None]] = []
+
+
+def add_stage_listener(listener: Callable[[Dict[str, Any]], None]):
+    """Forward every stage record to `listener` (e.g. across processes)."""
+    _stage_listeners.append(listener)
+
+
+def observe_stage(record: Dict[str, Any]):
+    """Update the stage metrics from a record produced by `track_stage`."""
+    stage = record["stage"]
+    status = record["status"]
+    STAGE_DURATION.observe(record["duration_s"], stage=stage, status=status)
+    STAGE_RUNS.inc(stage=stage, status=status, error=record["error"] or "")
+    STAGE_ROWS_IN.inc(record["rows_in"], stage=stage)
+    STAGE_ROWS_OUT.inc(record["rows_out"], stage=stage)
+    STAGE_BYTES_READ.inc(record["bytes_read"], stage=stage)
+    STAGE_ROWS_PER_SEC.set(record["rows_per_sec"], stage=stage)
+    STAGE_PEAK_RSS.set(record["peak_rss_bytes"], stage=stage)
+
+
+class StageTimer:
+    """Mutable handle yielded by `track_stage` to report rows and bytes."""
+
+    def __init__(
+        self, rows_in: int = 0, rows_out: Optional[int] = None, bytes_read: int = 0
+    ):
+        self.rows_in = rows_in
+        self.rows_out = rows_out
+        self.bytes_read = bytes_read
+
+
+@contextmanager
+def track_stage(
+    stage: str,
+    item: Optional[str] = None,
+    rows_in: int = 0,
+    rows_out: Optional[int] = None,
+    bytes_read: int = 0,
+) -> Iterator[StageTimer]:
+    """
+    Time one file or batch of a pipeline stage. Rows and bytes can be given
+    upfront or set on the yielded handle; `rows_out` defaults to `rows_in`.
+    The record feeds the metrics registry, the active run report and any
+    stage listeners, with `status` "error" and the exception type as `error`
+    when the block raises.
+    """
+    timer = StageTimer(rows_in, rows_out, bytes_read)
+    started = time.perf_counter()
+    error: Optional[str] = None
+    try:
+        yield timer
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        _record_stage(stage, item, timer, time.perf_counter() - started, error)
+
+
+def _record_stage(
+    stage: str,
+    item: Optional[str],
+    timer: StageTimer,
+    duration: float,
+    error: Optional[str],
+):
+    rows_out = timer.rows_in if timer.rows_out is None else timer.rows_out
+    record = {
+        "stage": stage,
+        "item": item,
+        "status": "ok" if error is None else "error",
+        "error": error,
+        "duration_s": duration,
+        "rows_in": int(timer.rows_in),
+        "rows_out": int(rows_out),
+        "bytes_read": int(timer.bytes_read),
+        "rows_per_sec": rows_out / max(duration, 1e-9),
+        "peak_rss_bytes": peak_rss_bytes(),
+    }
+    observe_stage(record)
+    if _current_report is not None:
+        _current_report.add(record)
+    for listener in _stage_listeners:
+        listener(record)
+
+
+@contextmanager
+def run_report(name: str, directory: Optional[str] = METRICS_REPORT_DIR):
+    """
+    Collect every stage tracked inside the block into a RunReport and write
+    it as JSON to `directory` at the end (skipped when no directory is set).
+    """
+    global _current_report
+    previous, _current_report = _current_report, RunReport(name)
+    report = _current_report
+    try:
+        yield report
+    finally:
+        report.finished_at = datetime.utcnow()
+        _current_report = previous
+        if directory:
+            path = report.write(directory)
+            print(f"Run report written to {path}")
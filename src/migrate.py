@@ -0,0 +1,38 @@
+"""
+One-time schema setup: create missing tables, columns and indexes.
+
+Run once per deployment, before (or alongside) starting the API:
+
+    python -m src.migrate
+
+The API itself never touches the schema; `/ready` reports 503 until this
+has run against the configured database.
+"""
+
+import logging
+import sys
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from src.database import engine, init_db, missing_schema
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+
+
+def main() -> int:
+    try:
+        init_db()
+        with engine.connect() as conn:
+            missing = missing_schema(conn)
+    except SQLAlchemyError as e:
+        logging.error("Migration failed: %s", e)
+        return 1
+    if missing:
+        logging.error("Schema still incomplete: %s", ", ".join(missing))
+        return 1
+    logging.info("Schema is up to date")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
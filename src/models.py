@@ -1,4 +1,13 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, BigInteger
+from sqlalchemy import (
+    Column,
+    Integer,
+    String,
+    Float,
+    DateTime,
+    BigInteger,
+    Boolean,
+    Index,
+)
 from datetime import datetime
 from src.database import Base
 
@@ -27,6 +36,21 @@ class YellowTaxiTrip(Base):
     congestion_surcharge = Column(Float, nullable=True)
     airport_fee = Column(Float, nullable=True)
 
+    __table_args__ = (
+        # Trips are appended roughly in pickup order: a BRIN index stays tiny
+        # and prunes block ranges for pickup time filters.
+        Index(
+            "ix_yellow_taxi_trips_pickup_brin",
+            "pickup_datetime",
+            postgresql_using="brin",
+        ),
+        Index("ix_yellow_taxi_trips_pu_pickup", "pu_location_id", "pickup_datetime"),
+        Index("ix_yellow_taxi_trips_do_pickup", "do_location_id", "pickup_datetime"),
+        Index(
+            "ix_yellow_taxi_trips_payment_pickup", "payment_type", "pickup_datetime"
+        ),
+    )
+
 
 class ImportLog(Base):
     __tablename__ = "import_log"
@@ -38,3 +62,36 @@ class ImportLog(Base):
     rows_imported = Column(Integer, default=0, nullable=False)
     status = Column(String, default="pending", nullable=False)
     message = Column(String, nullable=True)
+
+    # Live progress written by the pipeline job runner
+    params_key = Column(String, nullable=True, index=True)
+    stage = Column(String, nullable=True)
+    files_done = Column(Integer, default=0, nullable=True)
+    files_total = Column(Integer, nullable=True)
+    rows_per_sec = Column(Float, nullable=True)
+    updated_at = Column(DateTime, nullable=True)
+
+
+class TripStatisticsSummary(Base):
+    """
+    Single-row materialised summary of `yellow_taxi_trips`, refreshed at the
+    end of each pipeline run. API writes apply their count/sum deltas in
+    their own transaction; only removing the earliest or latest trip flags
+    it stale.
+    """
+
+    __tablename__ = "trip_statistics_summary"
+
+    id = Column(Integer, primary_key=True)
+    total_trips = Column(BigInteger, default=0, nullable=False)
+    earliest_trip = Column(DateTime, nullable=True)
+    latest_trip = Column(DateTime, nullable=True)
+    average_fare = Column(Float, nullable=True)
+    average_distance = Column(Float, nullable=True)
+    # Running sums behind the averages (NULL until the first refresh)
+    fare_sum = Column(Float, nullable=True)
+    fare_count = Column(BigInteger, nullable=True)
+    distance_sum = Column(Float, nullable=True)
+    distance_count = Column(BigInteger, nullable=True)
+    is_stale = Column(Boolean, default=False, nullable=False)
+    refreshed_at = Column(DateTime, default=datetime.utcnow, nullable=False)
@@ -0,0 +1,314 @@
+"""
+Precomputed origin-destination cube.
+
+Trip counts (uint32), fare sums and distance sums (float64, so that sums
+over millions of trips keep their cents) are stored as dense NumPy arrays
+of shape (zone, zone, weekday, hour): 266 pickup zones x 266 dropoff zones
+x 7 ISO weekdays x 24 hours (hour-of-week = weekday * 24 + hour). Zone
+index 0 is unused so TLC LocationIDs 1..265 index the arrays directly.
+
+The cube is built from DuckDB while importing each monthly Parquet file and
+updated incrementally: a manifest lists the files already added. Writers
+serialise on a lock file; every update writes a new version directory and
+then swaps the manifest, so the API can keep its memory-mapped arrays open
+while the importer runs. The last OD_MATRIX_KEEP_VERSIONS versions are kept
+for readers that read the previous manifest just before the swap.
+
+Backfill from an existing DuckDB database:
+
+    python -m src.od_matrix [--duckdb yellow_taxi.duckdb]
+"""
+
+import argparse
+import fcntl
+import json
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+OD_MATRIX_DIR = os.getenv("OD_MATRIX_DIR", "data/od_matrix")
+OD_MATRIX_KEEP_VERSIONS = int(os.getenv("OD_MATRIX_KEEP_VERSIONS", "3"))
+
+N_ZONES = 266
+N_WEEKDAYS = 7
+N_HOURS = 24
+SHAPE = (N_ZONES, N_ZONES, N_WEEKDAYS, N_HOURS)
+
+AXES = ("pickup_zone", "dropoff_zone", "weekday", "hour")
+METRICS = {
+    "counts": np.uint32,
+    "fare_sums": np.float64,
+    "distance_sums": np.float64,
+}
+MANIFEST = "manifest.json"
+
+# Per-cell aggregation; `{source}` is a table or a read_parquet() call
+AGGREGATE_SQL = """
+    SELECT
+        PULocationID AS pu_zone,
+        DOLocationID AS do_zone,
+        isodow(tpep_pickup_datetime) - 1 AS weekday,
+        hour(tpep_pickup_datetime) AS hour,
+        COUNT(*) AS counts,
+        SUM(COALESCE(fare_amount, 0)) AS fare_sums,
+        SUM(COALESCE(trip_distance, 0)) AS distance_sums
+    FROM {source}
+    WHERE tpep_pickup_datetime IS NOT NULL
+      AND PULocationID BETWEEN 1 AND 265
+      AND DOLocationID BETWEEN 1 AND 265
+    GROUP BY ALL
+"""
+
+
+class ODMatrixUnavailable(Exception):
+    """Raised when no cube has been built yet."""
+
+
+def _empty() -> Dict[str, np.ndarray]:
+    return {name: np.zeros(SHAPE, dtype=dtype) for name, dtype in METRICS.items()}
+
+
+@contextmanager
+def _locked(directory: Path):
+    """Serialise cube writers (manifest read-modify-write) across processes."""
+    directory.mkdir(parents=True, exist_ok=True)
+    with open(directory / ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _read_manifest(directory: Path) -> Optional[Dict[str, Any]]:
+    try:
+        return json.loads((directory / MANIFEST).read_text())
+    except FileNotFoundError:
+        return None
+
+
+def _add_aggregate(arrays: Dict[str, np.ndarray], conn, source: str):
+    """Add the per-cell aggregate of `source` into `arrays` in place."""
+    cells = conn.execute(AGGREGATE_SQL.format(source=source)).fetchnumpy()
+    index = tuple(
+        np.asarray(cells[column], dtype=np.intp)
+        for column in ("pu_zone", "do_zone", "weekday", "hour")
+    )
+    # Cells are unique per GROUP BY, so plain fancy-index addition is safe
+    for name, dtype in METRICS.items():
+        arrays[name][index] += np.asarray(cells[name]).astype(dtype)
+
+
+def _write(directory: Path, arrays: Dict[str, np.ndarray], files: List[str]):
+    """
+    Write a new version of the cube, then atomically publish its manifest.
+    Callers hold `_locked(directory)`.
+    """
+    previous = _read_manifest(directory)
+    version = previous["version"] + 1 if previous else 1
+
+    version_dir = directory / f"v{version}"
+    version_dir.mkdir(exist_ok=True)
+    for name, array in arrays.items():
+        np.save(version_dir / f"{name}.npy", array)
+
+    manifest = {
+        "version": version,
+        "files": sorted(files),
+        "updated_at": datetime.utcnow().isoformat(),
+    }
+    tmp = directory / f"{MANIFEST}.tmp"
+    tmp.write_text(json.dumps(manifest, indent=2))
+    os.replace(tmp, directory / MANIFEST)
+
+    # Readers keep older versions mapped, so unlinking them is safe on POSIX;
+    # the most recent ones stay for readers that have not mapped them yet
+    for old in directory.glob("v*"):
+        number = old.name[1:]
+        if (
+            old.is_dir()
+            and number.isdigit()
+            and int(number) <= version - max(OD_MATRIX_KEEP_VERSIONS, 1)
+        ):
+            shutil.rmtree(old, ignore_errors=True)
+
+
+def _load(directory: Path, manifest: Dict[str, Any], mmap_mode=None):
+    version_dir = directory / f"v{manifest['version']}"
+    arrays = {
+        name: np.load(version_dir / f"{name}.npy", mmap_mode=mmap_mode)
+        for name in METRICS
+    }
+    if mmap_mode is None:
+        # Cubes written before the sums were widened are upgraded on update
+        arrays = {
+            name: array.astype(METRICS[name], copy=False)
+            for name, array in arrays.items()
+        }
+    return arrays
+
+
+def update_from_parquet(conn, file_path: Path, directory: str = OD_MATRIX_DIR) -> bool:
+    """
+    Add one Parquet file's trips to the cube using an open DuckDB connection.
+    Returns False when the file is already part of the cube.
+    """
+    directory = Path(directory)
+    with _locked(directory):
+        manifest = _read_manifest(directory)
+        files = manifest["files"] if manifest else []
+        if file_path.name in files:
+            return False
+
+        arrays = _load(directory, manifest) if manifest else _empty()
+        _add_aggregate(arrays, conn, f"read_parquet('{file_path}')")
+        _write(directory, arrays, files + [file_path.name])
+    return True
+
+
+def rebuild(conn, directory: str = OD_MATRIX_DIR) -> List[str]:
+    """Rebuild the cube from the whole `yellow_taxi_trips` table."""
+    directory = Path(directory)
+    with _locked(directory):
+        arrays = _empty()
+        _add_aggregate(arrays, conn, "yellow_taxi_trips")
+        logged = conn.execute("SELECT file_name FROM import_log").fetchall()
+        files = [row[0] for row in logged]
+        _write(directory, arrays, files)
+    return files
+
+
+class ODMatrix:
+    """
+    Read side of the cube: memory-maps the current version and answers
+    slice/sum queries. The manifest is re-checked on every query (one
+    stat call), so a new version published by the importer is picked up
+    without restarting the API.
+    """
+
+    def __init__(self, directory: str = OD_MATRIX_DIR):
+        self.directory = Path(directory)
+        self.files: List[str] = []
+        self._arrays: Optional[Dict[str, np.ndarray]] = None
+        self._mtime: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def open(self) -> bool:
+        """Map the current version (again if it changed); False if none exists."""
+        try:
+            mtime = (self.directory / MANIFEST).stat().st_mtime_ns
+        except FileNotFoundError:
+            return False
+        if mtime == self._mtime:
+            return True
+        with self._lock:
+            manifest = _read_manifest(self.directory)
+            if manifest is None:
+                return False
+            self._arrays = _load(self.directory, manifest, mmap_mode="r")
+            self.files = manifest["files"]
+            self._mtime = mtime
+        return True
+
+    def query(
+        self,
+        group_by: Optional[str] = None,
+        pickup_zones: Optional[Sequence[int]] = None,
+        dropoff_zones: Optional[Sequence[int]] = None,
+        weekdays: Optional[Sequence[int]] = None,
+        hours: Optional[Sequence[int]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Sum the cube over the selected zones, ISO weekdays (1-7) and hours
+        (0-23), optionally keeping one axis as `group_by`. Raises ValueError
+        on out-of-range selections.
+        """
+        if not self.open():
+            raise ODMatrixUnavailable("OD matrix has not been built yet")
+
+        selections = [
+            _selection(pickup_zones, 1, N_ZONES - 1),
+            _selection(dropoff_zones, 1, N_ZONES - 1),
+            _selection(weekdays, 1, N_WEEKDAYS, offset=-1),
+            _selection(hours, 0, N_HOURS - 1),
+        ]
+        keep = AXES.index(group_by) if group_by else None
+        sum_axes = tuple(axis for axis in range(len(AXES)) if axis != keep)
+
+        arrays = self._arrays
+        totals = {}
+        for name, array in arrays.items():
+            # Zone axes come first, so the largest reductions happen early
+            for axis, index in enumerate(selections):
+                if index is not None:
+                    array = np.take(array, index, axis=axis)
+            totals[name] = np.atleast_1d(array.sum(axis=sum_axes, dtype=np.float64))
+
+        if keep is None:
+            keys: List[Optional[int]] = [None]
+        else:
+            index = selections[keep]
+            keys = list(index if index is not None else range(SHAPE[keep]))
+            if AXES[keep] == "weekday":
+                keys = [key + 1 for key in keys]
+
+        rows = []
+        for i, key in enumerate(keys):
+            trips = int(totals["counts"][i])
+            if trips == 0 and keep is not None:
+                continue
+            rows.append(
+                {
+                    "key": None if key is None else int(key),
+                    "trips": trips,
+                    "average_fare": (
+                        float(totals["fare_sums"][i]) / trips if trips else None
+                    ),
+                    "average_distance": (
+                        float(totals["distance_sums"][i]) / trips if trips else None
+                    ),
+                }
+            )
+        return rows
+
+
+def _selection(
+    values: Optional[Sequence[int]], low: int, high: int, offset: int = 0
+) -> Optional[np.ndarray]:
+    if not values:
+        return None
+    index = np.unique(np.asarray(values, dtype=np.intp))
+    if index[0] < low or index[-1] > high:
+        raise ValueError(f"Values must be between {low} and {high}")
+    return index + offset
+
+
+cube = ODMatrix(OD_MATRIX_DIR)
+
+
+def main(argv: Optional[List[str]] = None):
+    import duckdb
+
+    parser = argparse.ArgumentParser(description="Rebuild the OD matrix from DuckDB.")
+    parser.add_argument(
+        "--duckdb", default=os.getenv("DUCKDB_FILE", "yellow_taxi.duckdb")
+    )
+    parser.add_argument("--out", default=OD_MATRIX_DIR)
+    args = parser.parse_args(argv)
+
+    conn = duckdb.connect(args.duckdb, read_only=True)
+    try:
+        files = rebuild(conn, args.out)
+    finally:
+        conn.close()
+    print(f"OD matrix rebuilt from {len(files)} files into {args.out}")
+
+
+if __name__ == "__main__":
+    main()
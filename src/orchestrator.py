@@ -0,0 +1,463 @@
+"""
+End-to-end pipeline orchestrator.
+
+Runs download -> DuckDB import -> Postgres export -> clean to MongoDB as
+one DAG of streaming stages. Each stage is a pool of worker threads that
+reads from a bounded queue and emits into the next one, so a month moves
+on as soon as it is ready: January is exported while February is still
+downloading, and every exported batch is cleaned while the next one is
+read. A full queue blocks its producers, which keeps memory bounded however
+far ahead the upstream stages get.
+
+Items passed between stages:
+
+    download         month               -> Parquet file
+    duckdb_import    Parquet file        -> (file name, first/last ingest id)
+    postgres_export  file's ingest ids   -> (file name, batch of new trips)
+    clean            batch of new trips  -> MongoDB documents, monthly sketches
+
+DuckDB has a single writer, so the import stage always runs one worker.
+Export workers share one dedup index, so a trip found in two files is
+exported once. Exported batches carry the ids the trips were given in
+Postgres, so their MongoDB documents match those of `src.data_cleaner`.
+Files imported before ingest ids were logged are covered by exporting the
+whole DuckDB table once (the dedup index drops what Postgres already has).
+
+Every stage is idempotent: downloads and imports skip existing files and
+the export drops trips already in Postgres (dedup index), so a run can be
+repeated, or resumed with `--from-stage`:
+
+    duckdb_import    import the months' Parquet files already downloaded
+    postgres_export  export the months' files already imported into DuckDB
+    clean            re-clean the months' trips from Postgres (their MongoDB
+                     documents and sketches are replaced)
+
+A batch exported to Postgres is not exported again, so if a run fails after
+the export, resume with `--from-stage clean` for the affected months.
+
+Usage:
+    python -m src.orchestrator --year 2025 --months 1 2 3 \
+        [--from-stage postgres_export] [--export-workers 2] [--clean-workers 2]
+
+`python -m benchmarks.pipeline` compares its wall-clock time with running
+the standalone scripts one after another.
+"""
+
+import argparse
+import os
+import queue
+import sys
+import threading
+import time
+import traceback
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from src.metrics import run_report, track_stage
+
+QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "4"))
+DOWNLOAD_WORKERS = int(os.getenv("PIPELINE_DOWNLOAD_WORKERS", "2"))
+EXPORT_WORKERS = int(os.getenv("PIPELINE_EXPORT_WORKERS", "2"))
+CLEAN_WORKERS = int(os.getenv("PIPELINE_CLEAN_WORKERS", "2"))
+
+STAGES = ("download", "duckdb_import", "postgres_export", "clean")
+
+# How often blocked workers check whether another stage failed
+POLL_INTERVAL = 0.2
+
+_DONE = object()
+
+
+class PipelineFailed(Exception):
+    """Raised when a stage worker (or the source) fails; the run is aborted."""
+
+
+class _Aborted(Exception):
+    pass
+
+
+class Stage:
+    """
+    One step of the DAG. `fn(context, item, emit)` processes an item and
+    calls `emit` for every item it passes downstream; `setup()` builds the
+    per-worker context (connections, ...) and `teardown(context)` releases it.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        fn: Callable[[Any, Any, Callable[[Any], None]], None],
+        workers: int = 1,
+        setup: Optional[Callable[[], Any]] = None,
+        teardown: Optional[Callable[[Any], None]] = None,
+    ):
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, workers)
+        self.setup = setup
+        self.teardown = teardown
+        self.items = 0
+        self.busy_s = 0.0
+        self.blocked_s = 0.0
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _record(self, started: float, finished: float, blocked: float):
+        with self._lock:
+            self.items += 1
+            self.busy_s += finished - started - blocked
+            self.blocked_s += blocked
+            if self.started_at is None or started < self.started_at:
+                self.started_at = started
+            if self.finished_at is None or finished > self.finished_at:
+                self.finished_at = finished
+
+
+class Pipeline:
+    """Linear DAG of stages connected by bounded queues."""
+
+    def __init__(self, stages: List[Stage], queue_size: int = QUEUE_SIZE):
+        self.stages = stages
+        self.queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+        self.errors: List[str] = []
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._failed = threading.Event()
+        self._remaining = [stage.workers for stage in stages]
+        self._lock = threading.Lock()
+
+    def _put(self, q: queue.Queue, item):
+        while not self._failed.is_set():
+            try:
+                q.put(item, timeout=POLL_INTERVAL)
+                return
+            except queue.Full:
+                pass
+        raise _Aborted
+
+    def _get(self, q: queue.Queue):
+        while not self._failed.is_set():
+            try:
+                return q.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                pass
+        raise _Aborted
+
+    def _fail(self, where: str):
+        self.errors.append(f"{where}: {traceback.format_exc()}")
+        self._failed.set()
+
+    def _close(self, index: int):
+        """Send one end marker per downstream worker once a stage has drained."""
+        with self._lock:
+            self._remaining[index] -= 1
+            done = self._remaining[index] == 0
+        if done and index + 1 < len(self.stages):
+            for _ in range(self.stages[index + 1].workers):
+                self._put(self.queues[index + 1], _DONE)
+
+    def _feed(self, sources: Iterable):
+        try:
+            for item in sources:
+                self._put(self.queues[0], item)
+            for _ in range(self.stages[0].workers):
+                self._put(self.queues[0], _DONE)
+        except _Aborted:
+            pass
+        except Exception:
+            self._fail("source")
+
+    def _work(self, index: int):
+        stage = self.stages[index]
+        outbox = self.queues[index + 1] if index + 1 < len(self.stages) else None
+        blocked = [0.0]
+
+        def emit(item):
+            if outbox is None:
+                return
+            waited = time.perf_counter()
+            self._put(outbox, item)
+            blocked[0] += time.perf_counter() - waited
+
+        context = None
+        try:
+            context = stage.setup() if stage.setup else None
+            while True:
+                item = self._get(self.queues[index])
+                if item is _DONE:
+                    break
+                blocked[0] = 0.0
+                started = time.perf_counter()
+                stage.fn(context, item, emit)
+                stage._record(started, time.perf_counter(), blocked[0])
+            self._close(index)
+        except _Aborted:
+            pass
+        except Exception:
+            self._fail(stage.name)
+        finally:
+            if stage.teardown and context is not None:
+                try:
+                    stage.teardown(context)
+                except Exception:
+                    traceback.print_exc()
+
+    def run(self, sources: Iterable):
+        """Feed `sources` into the first stage and wait for every stage to drain."""
+        self.started_at = time.perf_counter()
+        threads = [
+            threading.Thread(target=self._feed, args=(sources,), name="source")
+        ]
+        for index, stage in enumerate(self.stages):
+            threads.extend(
+                threading.Thread(
+                    target=self._work, args=(index,), name=f"{stage.name}-{n}"
+                )
+                for n in range(stage.workers)
+            )
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.finished_at = time.perf_counter()
+        if self.errors:
+            raise PipelineFailed("\n".join(self.errors))
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Per stage: items, busy/blocked seconds, first start and last finish."""
+        origin = self.started_at or 0.0
+        result = {}
+        for stage in self.stages:
+            result[stage.name] = {
+                "workers": stage.workers,
+                "items": stage.items,
+                "busy_s": stage.busy_s,
+                "blocked_s": stage.blocked_s,
+                "started_s": (stage.started_at or origin) - origin,
+                "finished_s": (stage.finished_at or origin) - origin,
+            }
+        return result
+
+
+def month_range(year: int, month: int):
+    start = datetime(year, month, 1)
+    end = datetime(year + month // 12, month % 12 + 1, 1)
+    return start, end
+
+
+def run_pipeline(
+    year: int,
+    months: Optional[List[int]] = None,
+    data_dir: str = "data/raw",
+    duckdb_file: str = os.getenv("DUCKDB_FILE", "yellow_taxi.duckdb"),
+    from_stage: str = "download",
+    workers: Optional[Dict[str, int]] = None,
+    queue_size: int = QUEUE_SIZE,
+) -> Pipeline:
+    """Run the stages from `from_stage` onwards for `months` of `year`."""
+    from src.download_data import NYCTaxiDataDownloader
+
+    workers = {
+        "download": DOWNLOAD_WORKERS,
+        "postgres_export": EXPORT_WORKERS,
+        "clean": CLEAN_WORKERS,
+        **(workers or {}),
+        "duckdb_import": 1,
+    }
+    downloader = NYCTaxiDataDownloader(year=year, data_dir=data_dir)
+    months = months or downloader.available_months()
+    selected = STAGES[STAGES.index(from_stage) :]
+    stages: List[Stage] = []
+    importer = cleaner = None
+    sketches: Dict[str, Any] = {}
+    full_export = threading.Event()
+
+    if "postgres_export" in selected:
+        from src.import_to_duckdb import DuckDBImporter
+
+        # The import stage writes to and the export stage reads from this database
+        importer = DuckDBImporter(duckdb_file)
+
+    def emit_ingest_ids(file_path: Path, emit):
+        ingest_ids = importer.file_ingest_ids(file_path.name)
+        if ingest_ids is not None:
+            emit((file_path.name, *ingest_ids))
+            return
+        # Imported before ingest id ranges were logged: export every trip once
+        if full_export.is_set():
+            return
+        full_export.set()
+        print(f"No ingest id range logged for {file_path.name}; exporting all trips.")
+        ingest_ids = importer.ingest_id_range()
+        if ingest_ids is not None:
+            emit(("yellow_taxi_trips", *ingest_ids))
+
+    if "download" in selected:
+
+        def download(context, month, emit):
+            if downloader.download_month(month):
+                emit(downloader.get_file_path(month))
+
+        stages.append(Stage("download", download, workers["download"]))
+
+    if "duckdb_import" in selected:
+
+        def import_file(context, file_path, emit):
+            if importer.import_parquet(file_path):
+                emit_ingest_ids(file_path, emit)
+
+        stages.append(Stage("duckdb_import", import_file, 1))
+
+    if "postgres_export" in selected:
+        import src.duckdb_to_postgres as export
+
+        # Shared by the workers: a trip claimed by one is skipped by the others
+        dedup_index = export.open_index(export.TABLE_NAME)
+
+        def open_export():
+            # Cursors are separate DuckDB connections to the importer's database
+            return {
+                "duckdb": importer.conn.cursor(),
+                "postgres": export.connect_postgres(),
+            }
+
+        def close_export(context):
+            context["postgres"].close()
+            context["duckdb"].close()
+
+        def export_file(context, item, emit):
+            name, first_id, last_id = item
+            batches = export.export_rows(
+                context["duckdb"],
+                context["postgres"],
+                dedup_index,
+                first_id,
+                last_id,
+                item=name,
+            )
+            for df in batches:
+                if not df.empty:
+                    # Postgres stores vendor_id as text: clean the batch as
+                    # it would be read back from there
+                    df["vendor_id"] = df["vendor_id"].astype(str)
+                    emit((name, df))
+
+        stages.append(
+            Stage(
+                "postgres_export",
+                export_file,
+                workers["postgres_export"],
+                setup=open_export,
+                teardown=close_export,
+            )
+        )
+
+    if "clean" in selected:
+        from src.data_cleaner import DataCleaner
+
+        cleaner = DataCleaner()
+
+        def clean(context, item, emit):
+            name, df = item
+            with track_stage("clean", item=name, rows_in=len(df)) as stage:
+                stage.rows_out = cleaner.store_cleaned(df, sketches)
+
+        stages.append(Stage("clean", clean, workers["clean"]))
+
+    def sources():
+        if from_stage == "download":
+            yield from months
+            return
+        for month in months:
+            file_path = downloader.get_file_path(month)
+            if from_stage == "clean":
+                start, end = month_range(year, month)
+                cleaner.delete_month(start, end)
+                for df in cleaner.read_month(start, end):
+                    yield f"{year}-{month:02d}", df
+            elif from_stage == "postgres_export":
+                if importer.is_file_imported(file_path.name):
+                    ranges: List[Any] = []
+                    emit_ingest_ids(file_path, ranges.append)
+                    yield from ranges
+                else:
+                    print(f"{file_path.name} has not been imported, skipping.")
+            elif file_path.exists():
+                yield file_path
+            else:
+                print(f"{file_path.name} has not been downloaded, skipping.")
+
+    pipeline = Pipeline(stages, queue_size)
+    try:
+        pipeline.run(sources())
+    finally:
+        if cleaner is not None:
+            from src.sketches import save_monthly
+
+            # Streamed batches only hold new trips: add them to the stored
+            # month sketches. Re-cleaned months are replaced.
+            save_monthly(sketches, merge=from_stage != "clean")
+            cleaner.close()
+        if importer is not None:
+            importer.close()
+    return pipeline
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Run download -> DuckDB -> Postgres -> MongoDB as one pipeline."
+    )
+    parser.add_argument("--year", type=int, default=2025)
+    parser.add_argument(
+        "--months", type=int, nargs="+", help="Default: every published month"
+    )
+    parser.add_argument("--data-dir", default="data/raw")
+    parser.add_argument(
+        "--duckdb", default=os.getenv("DUCKDB_FILE", "yellow_taxi.duckdb")
+    )
+    parser.add_argument("--from-stage", choices=STAGES, default="download")
+    parser.add_argument("--download-workers", type=int, default=DOWNLOAD_WORKERS)
+    parser.add_argument("--export-workers", type=int, default=EXPORT_WORKERS)
+    parser.add_argument("--clean-workers", type=int, default=CLEAN_WORKERS)
+    parser.add_argument("--queue-size", type=int, default=QUEUE_SIZE)
+    args = parser.parse_args(argv)
+
+    workers = {
+        "download": args.download_workers,
+        "postgres_export": args.export_workers,
+        "clean": args.clean_workers,
+    }
+    started = time.perf_counter()
+    try:
+        with run_report("orchestrator"):
+            pipeline = run_pipeline(
+                args.year,
+                args.months,
+                args.data_dir,
+                args.duckdb,
+                args.from_stage,
+                workers,
+                args.queue_size,
+            )
+    except PipelineFailed as e:
+        print(f"Pipeline failed:\n{e}")
+        print(
+            "Completed steps are kept; re-run with --from-stage (use clean for "
+            "months whose exported trips were not all cleaned)."
+        )
+        return 1
+
+    print(f"\nPipeline finished in {time.perf_counter() - started:.1f} s")
+    for name, stage in pipeline.summary().items():
+        print(
+            f" - {name:<16} {stage['workers']} worker(s), {stage['items']} items, "
+            f"busy {stage['busy_s']:.1f} s, blocked {stage['blocked_s']:.1f} s, "
+            f"active {stage['started_s']:.1f}-{stage['finished_s']:.1f} s"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+from datetime import date
+from typing import List, Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from starlette.concurrency import run_in_threadpool
+
+from src import analytics, schemas
+
+router = APIRouter()
+
+
+@router.get(
+    "/analytics/{group_by}",
+    response_model=schemas.AnalyticsResult,
+    tags=["Analytics"],
+)
+async def get_analytics(
+    group_by: schemas.AnalyticsDimension,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    pu_location_id: Optional[int] = None,
+    do_location_id: Optional[int] = None,
+    payment_type: Optional[int] = None,
+):
+    """
+    Aggregate trips by `group_by` directly on the DuckDB columnar file.
+    - `start` / `end`: pickup date range (end exclusive)
+    - `pu_location_id`, `do_location_id`, `payment_type`: optional filters
+    Each row holds trip count, revenue, average fare and average distance.
+    Postgres is never queried by this endpoint.
+    """
+    try:
+        rows = await run_in_threadpool(
+            analytics.aggregate_trips,
+            group_by.value,
+            start=start,
+            end=end,
+            pu_location_id=pu_location_id,
+            do_location_id=do_location_id,
+            payment_type=payment_type,
+        )
+    except analytics.AnalyticsUnavailable:
+        raise HTTPException(status_code=503, detail="Analytics store unavailable")
+    return schemas.AnalyticsResult(group_by=group_by, rows=rows)
+
+
+@router.get("/od-matrix", response_model=schemas.ODResult, tags=["Analytics"])
+async def get_od_matrix(
+    group_by: Optional[schemas.ODDimension] = None,
+    pu_location_id: Optional[List[int]] = Query(None),
+    do_location_id: Optional[List[int]] = Query(None),
+    weekday: Optional[List[int]] = Query(None),
+    hour: Optional[List[int]] = Query(None),
+):
+    """
+    Trip volume, average fare and average distance between zones, answered
+    from the precomputed origin-destination cube (no database query).
+    - `pu_location_id`, `do_location_id`: zones (repeatable)
+    - `weekday`: ISO weekday 1-7 (repeatable), `hour`: 0-23 (repeatable)
+    - `group_by`: keep one axis in the result; totals otherwise
+    """
+    # Imported on first use: the cube needs numpy, kept out of API startup.
+    # The current version is memory-mapped by the first query.
+    from src.od_matrix import ODMatrixUnavailable, cube
+
+    try:
+        rows = cube.query(
+            group_by.value if group_by else None,
+            pickup_zones=pu_location_id,
+            dropoff_zones=do_location_id,
+            weekdays=weekday,
+            hours=hour,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ODMatrixUnavailable:
+        raise HTTPException(status_code=503, detail="OD matrix not built yet")
+    return schemas.ODResult(group_by=group_by, files=cube.files, rows=rows)
@@ -1,13 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
-from sqlalchemy.orm import Session
+from fastapi import (
+    APIRouter,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+)
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
-import logging
-import traceback
+from typing import List, Optional
 
-from src.database import get_db
-from src import schemas
+from src.database import get_async_db
+from src import bulk, export, schemas
 from src.models import ImportLog
-from src.dlt_pipeline import NYCTaxiDLTPipeline  # adjust import if needed
+from src.jobs import runner
 from src.services import TaxiTripService
 
 router = APIRouter()
@@ -15,60 +23,147 @@ router = APIRouter()
 # --- CRUD: Taxi Trips ---
 
 
-@router.get("/trips", response_model=schemas.TaxiTripList, tags=["Trips"])
-def get_trips(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+@router.get(
+    "/trips",
+    response_model=schemas.TaxiTripList,
+    response_class=ORJSONResponse,
+    tags=["Trips"],
+)
+async def get_trips(
+    skip: int = 0,
+    limit: int = 100,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    pu_location_id: Optional[int] = None,
+    do_location_id: Optional[int] = None,
+    payment_type: Optional[int] = None,
+    min_fare: Optional[float] = None,
+    max_fare: Optional[float] = None,
+    min_distance: Optional[float] = None,
+    max_distance: Optional[float] = None,
+    db: AsyncSession = Depends(get_async_db),
+):
     """
     Retrieve a paginated list of taxi trips.
     - `skip`: number of records to skip (for pagination)
     - `limit`: number of records to return
+    - `start` / `end`: pickup datetime range (end exclusive)
+    - `pu_location_id` / `do_location_id`: pickup / dropoff zone
+    - `payment_type`: payment type code
+    - `min_fare` / `max_fare`, `min_distance` / `max_distance`: inclusive ranges
+    """
+    conditions = TaxiTripService.trip_filters(
+        start=start,
+        end=end,
+        pu_location_id=pu_location_id,
+        do_location_id=do_location_id,
+        payment_type=payment_type,
+        min_fare=min_fare,
+        max_fare=max_fare,
+        min_distance=min_distance,
+        max_distance=max_distance,
+    )
+    trips, total = await TaxiTripService.get_trips(
+        db, skip=skip, limit=limit, conditions=conditions
+    )
+    # Rows come straight from the database: skip response_model validation
+    # and encode them with orjson.
+    return ORJSONResponse({"total": total, "trips": trips})
+
+
+@router.get("/trips/export", tags=["Trips"])
+async def export_trips(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    pu_location_id: Optional[int] = None,
+    do_location_id: Optional[int] = None,
+    accept: Optional[str] = Header(default=None),
+):
+    """
+    Stream every matching trip in a single response.
+    - `start` / `end`: pickup datetime range (end exclusive)
+    - `pu_location_id` / `do_location_id`: pickup / dropoff zone
+    The format follows the Accept header: NDJSON (default), Arrow IPC stream
+    (`application/vnd.apache.arrow.stream`), Arrow IPC file
+    (`application/vnd.apache.arrow.file`) or Parquet
+    (`application/vnd.apache.parquet`).
     """
-    trips, total = TaxiTripService.get_trips(db, skip=skip, limit=limit)
-    return schemas.TaxiTripList(total=total, trips=trips)
+    export_format = export.negotiate_format(accept)
+    conditions = TaxiTripService.trip_filters(
+        start=start,
+        end=end,
+        pu_location_id=pu_location_id,
+        do_location_id=do_location_id,
+    )
+    return StreamingResponse(
+        export.stream_trips(conditions, export_format), media_type=export_format
+    )
 
 
 @router.get("/trips/{trip_id}", response_model=schemas.TaxiTrip, tags=["Trips"])
-def get_trip(trip_id: int, db: Session = Depends(get_db)):
+async def get_trip(trip_id: int, db: AsyncSession = Depends(get_async_db)):
     """
     Retrieve a single trip by its unique ID.
     Raises a 404 error if the trip does not exist.
     """
-    trip = TaxiTripService.get_trip(db, trip_id)
+    trip = await TaxiTripService.get_trip(db, trip_id)
     if not trip:
         raise HTTPException(status_code=404, detail="Trip not found")
     return trip
 
 
 @router.post("/trips", response_model=schemas.TaxiTrip, tags=["Trips"])
-def create_trip(trip: schemas.TaxiTripCreate, db: Session = Depends(get_db)):
+async def create_trip(
+    trip: schemas.TaxiTripCreate, db: AsyncSession = Depends(get_async_db)
+):
     """
     Create a new taxi trip record.
     Expects a JSON body matching the TaxiTripCreate schema.
     """
-    return TaxiTripService.create_trip(db, trip)
+    return await TaxiTripService.create_trip(db, trip)
+
+
+@router.post("/trips/bulk", response_model=schemas.BulkResult, tags=["Trips"])
+async def bulk_create_trips(request: Request, db: AsyncSession = Depends(get_async_db)):
+    """
+    Create or upsert many trips in one request and one transaction.
+    Accepts a JSON array, NDJSON (`application/x-ndjson`) or Parquet
+    (`application/vnd.apache.parquet`) body. Rows carrying an `id` are
+    upserted, the others inserted. Invalid rows are rejected individually
+    and reported with per-batch accept/reject counts.
+    """
+    body = await request.body()
+    batches = bulk.parse_body(body, request.headers.get("content-type", ""))
+    try:
+        return await TaxiTripService.bulk_upsert_trips(db, batches)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid bulk body: {e}")
 
 
 @router.put("/trips/{trip_id}", response_model=schemas.TaxiTrip, tags=["Trips"])
-def update_trip(
-    trip_id: int, trip: schemas.TaxiTripUpdate, db: Session = Depends(get_db)
+async def update_trip(
+    trip_id: int,
+    trip: schemas.TaxiTripUpdate,
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     Update an existing taxi trip record.
     Raises a 404 error if the trip ID does not exist.
     """
-    updated = TaxiTripService.update_trip(db, trip_id, trip)
+    updated = await TaxiTripService.update_trip(db, trip_id, trip)
     if not updated:
         raise HTTPException(status_code=404, detail="Trip not found")
     return updated
 
 
 @router.delete("/trips/{trip_id}", tags=["Trips"])
-def delete_trip(trip_id: int, db: Session = Depends(get_db)):
+async def delete_trip(trip_id: int, db: AsyncSession = Depends(get_async_db)):
     """
     Delete a taxi trip by its ID.
     Returns a success message if deletion is successful,
     or raises 404 if the trip is not found.
     """
-    deleted = TaxiTripService.delete_trip(db, trip_id)
+    deleted = await TaxiTripService.delete_trip(db, trip_id)
     if not deleted:
         raise HTTPException(status_code=404, detail="Trip not found")
     return {"message": f"Trip {trip_id} deleted successfully"}
@@ -78,7 +173,7 @@ def delete_trip(trip_id: int, db: Session = Depends(get_db)):
 
 
 @router.get("/statistics", response_model=schemas.Statistics, tags=["Statistics"])
-def get_statistics(db: Session = Depends(get_db)):
+async def get_statistics(db: AsyncSession = Depends(get_async_db)):
     """
     Retrieve aggregated statistics on taxi trips.
     This could include metrics such as:
@@ -86,85 +181,74 @@ def get_statistics(db: Session = Depends(get_db)):
     - average trip distance
     - average fare amount
     etc.
+    Served from an in-process TTL cache backed by the materialised
+    `trip_statistics_summary` table, refreshed after each pipeline run.
     """
-    stats = TaxiTripService.get_statistics(db)
+    stats = await TaxiTripService.get_statistics(db)
     return stats
 
 
+@router.get(
+    "/statistics/percentiles",
+    response_model=schemas.PercentileStatistics,
+    tags=["Statistics"],
+)
+async def get_percentile_statistics(
+    start_month: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}$"),
+    end_month: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}$"),
+    q: List[float] = Query(list(schemas.DEFAULT_QUANTILES)),
+):
+    """
+    Approximate percentiles of fare, distance and duration (minutes), plus
+    the number of distinct pickup/dropoff zone pairs, for pickup months
+    `start_month`..`end_month` ("YYYY-MM", inclusive).
+    Merged from the per-month sketches written by the data cleaner, so the
+    cost depends on the number of months only.
+    """
+    # Imported on first use: the sketches need numpy, kept out of API startup
+    from src.sketches import store as sketch_store
+
+    if any(not 0 <= value <= 1 for value in q):
+        raise HTTPException(status_code=400, detail="q must be between 0 and 1")
+    return await run_in_threadpool(sketch_store.percentiles, start_month, end_month, q)
+
+
 # --- PIPELINE ---
 
 
-@router.post(
-    "/pipeline/run", response_model=schemas.PipelineResponse, tags=["Pipeline"]
+@router.post("/pipeline/run", response_model=schemas.PipelineRun, tags=["Pipeline"])
+async def run_pipeline(destination: str = "postgres"):
+    """
+    Queue a run of the NYC Taxi DLT pipeline (non-blocking).
+    Runs execute in a dedicated worker process, one at a time by default
+    (`PIPELINE_MAX_CONCURRENCY`). An identical request made while a run is
+    queued or running returns that run instead of starting a new one.
+    Follow progress with `GET /pipeline/runs/{run_id}`.
+    """
+    return await run_in_threadpool(runner.submit, {"destination": destination})
+
+
+@router.get(
+    "/pipeline/runs/{run_id}", response_model=schemas.PipelineRun, tags=["Pipeline"]
 )
-def run_pipeline(background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+async def get_pipeline_run(run_id: int, db: AsyncSession = Depends(get_async_db)):
     """
-    Trigger the NYC Taxi DLT pipeline asynchronously (non-blocking).
-    The API returns immediately while the ETL runs in a background task.
+    Retrieve the status and live progress of a pipeline run:
+    current stage, files done / total, rows imported and rows/sec.
     """
+    log = await db.get(ImportLog, run_id)
+    if not log:
+        raise HTTPException(status_code=404, detail="Pipeline run not found")
+    return log
 
-    import_date = datetime.utcnow()
-    file_name = f"nyc_taxi_pipeline_{import_date:%Y%m%d_%H%M%S}"
 
-    # Create a placeholder log entry for this pipeline run
-    log = ImportLog(
-        file_name=file_name,
-        import_date=import_date,
-        rows_imported=0,
-        status="running",
-        message="Pipeline started...",
-    )
-    db.add(log)
-    db.commit()
-    db.refresh(log)
-
-    # Define the background job
-    def background_job(log_id: int):
-        session = None
-        try:
-            from src.database import SessionLocal
-
-            session = SessionLocal()
-
-            pipeline = NYCTaxiDLTPipeline()
-            load_info = pipeline.run_pipeline(destination="postgres")
-
-            rows_imported = getattr(load_info, "rows_imported", 0)
-            message = str(load_info)
-
-            log_entry = session.query(ImportLog).filter(ImportLog.id == log_id).first()
-            if log_entry:
-                log_entry.rows_imported = rows_imported
-                log_entry.status = "completed"
-                log_entry.message = message[:5000]
-                log_entry.completed_at = datetime.utcnow()
-                session.commit()
-
-        except Exception as e:
-            logging.error("Pipeline execution failed", exc_info=True)
-            if session:
-                log_entry = (
-                    session.query(ImportLog).filter(ImportLog.id == log_id).first()
-                )
-                if log_entry:
-                    log_entry.status = "failed"
-                    log_entry.message = (
-                        f"{type(e).__name__}: {str(e)}\n{traceback.format_exc()[:4000]}"
-                    )
-                    log_entry.completed_at = datetime.utcnow()
-                    session.commit()
-        finally:
-            if session:
-                session.close()
-
-    # Run background job asynchronously
-    background_tasks.add_task(background_job, log.id)
-
-    # Return immediate response
-    return schemas.PipelineResponse(
-        file_name=file_name,
-        import_date=import_date,
-        rows_imported=0,
-        message="Pipeline started asynchronously.",
-        status="running",
-    )
+@router.delete("/pipeline/runs/{run_id}", tags=["Pipeline"])
+async def cancel_pipeline_run(run_id: int):
+    """
+    Cancel a queued or running pipeline run.
+    Raises 404 if the run is not queued or running.
+    """
+    cancelled = await run_in_threadpool(runner.cancel, run_id)
+    if not cancelled:
+        raise HTTPException(status_code=404, detail="No active pipeline run found")
+    return {"message": f"Pipeline run {run_id} cancelled"}
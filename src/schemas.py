@@ -1,6 +1,7 @@
-from pydantic import BaseModel, ConfigDict
-from datetime import datetime
-from typing import Optional, List
+from pydantic import BaseModel, ConfigDict, PositiveInt
+from datetime import date, datetime
+from enum import Enum
+from typing import Dict, Optional, List, Union
 
 
 # Base Schemas
@@ -36,6 +37,10 @@ class TaxiTripUpdate(TaxiTripBase):
     pass
 
 
+class TaxiTripBulkItem(TaxiTripBase):
+    id: Optional[PositiveInt] = None
+
+
 class TaxiTrip(TaxiTripBase):
     id: int
     model_config = ConfigDict(from_attributes=True)
@@ -46,6 +51,19 @@ class TaxiTripList(BaseModel):
     trips: List[TaxiTrip]
 
 
+class BulkBatchResult(BaseModel):
+    batch: int
+    accepted: int
+    rejected: int
+    errors: List[str] = []
+
+
+class BulkResult(BaseModel):
+    accepted: int
+    rejected: int
+    batches: List[BulkBatchResult]
+
+
 class Statistics(BaseModel):
     total_trips: int
     earliest_trip: Optional[datetime]
@@ -54,7 +72,77 @@ class Statistics(BaseModel):
     average_distance: Optional[float]
 
 
+# Quantiles reported by the percentile statistics unless others are asked for
+DEFAULT_QUANTILES = (0.5, 0.95, 0.99)
+
+
+class PercentileStatistics(BaseModel):
+    months: List[str]
+    total_trips: int
+    distinct_zone_pairs: int
+    # metric -> {"p50": value, ...}
+    percentiles: Dict[str, Dict[str, Optional[float]]]
+
+
 class PipelineResponse(BaseModel):
     file_name: str
     rows_imported: int
     import_date: datetime
+
+
+class PipelineRun(PipelineResponse):
+    id: int
+    status: str
+    stage: Optional[str] = None
+    files_done: Optional[int] = None
+    files_total: Optional[int] = None
+    rows_per_sec: Optional[float] = None
+    message: Optional[str] = None
+    updated_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+    model_config = ConfigDict(from_attributes=True)
+
+
+# Analytics Schemas
+
+
+class AnalyticsDimension(str, Enum):
+    hour = "hour"
+    weekday = "weekday"
+    day = "day"
+    pickup_zone = "pickup_zone"
+    dropoff_zone = "dropoff_zone"
+    payment_type = "payment_type"
+
+
+class AnalyticsRow(BaseModel):
+    key: Optional[Union[int, date]]
+    trips: int
+    revenue: Optional[float]
+    average_fare: Optional[float]
+    average_distance: Optional[float]
+
+
+class AnalyticsResult(BaseModel):
+    group_by: AnalyticsDimension
+    rows: List[AnalyticsRow]
+
+
+class ODDimension(str, Enum):
+    pickup_zone = "pickup_zone"
+    dropoff_zone = "dropoff_zone"
+    weekday = "weekday"
+    hour = "hour"
+
+
+class ODRow(BaseModel):
+    key: Optional[int]
+    trips: int
+    average_fare: Optional[float]
+    average_distance: Optional[float]
+
+
+class ODResult(BaseModel):
+    group_by: Optional[ODDimension]
+    files: List[str]
+    rows: List[ODRow]
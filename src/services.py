@@ -1,84 +1,541 @@
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, or_, select, update
+from sqlalchemy.dialects.postgresql import insert
+from starlette.concurrency import run_in_threadpool
 from src import models, schemas
+from src.bulk import TRIP_COLUMNS, BulkBatch
+from src.cache import TTLCache, backend_from_url
+from src.database import SessionLocal
+
+STATISTICS_CACHE_TTL = float(os.getenv("STATISTICS_CACHE_TTL", "60"))
+STATISTICS_SUMMARY_ID = 1
+
+TRIP_CACHE_SIZE = int(os.getenv("TRIP_CACHE_SIZE", "10000"))
+TRIP_CACHE_TTL = float(os.getenv("TRIP_CACHE_TTL", "300"))
+# Optional shared storage for the trip cache, e.g. redis://redis:6379/0
+TRIP_CACHE_BACKEND = os.getenv("TRIP_CACHE_BACKEND")
+# With a shared backend, how long a worker may serve its own copy of a trip
+# that another worker has since updated or deleted
+TRIP_CACHE_LOCAL_TTL = float(os.getenv("TRIP_CACHE_LOCAL_TTL", "1"))
+
+# Plain column tuples are selected on the hot read paths instead of ORM objects
+ROW_COLUMNS = list(models.YellowTaxiTrip.__table__.columns)
+ROW_COLUMN_NAMES = [c.name for c in ROW_COLUMNS]
+
+statistics_cache = TTLCache(ttl=STATISTICS_CACHE_TTL)
+trip_cache = TTLCache(
+    ttl=TRIP_CACHE_TTL,
+    maxsize=TRIP_CACHE_SIZE,
+    backend=backend_from_url(TRIP_CACHE_BACKEND, "trips"),
+    local_ttl=TRIP_CACHE_LOCAL_TTL,
+    serializer=(
+        lambda trip: trip.model_dump_json().encode(),
+        schemas.TaxiTrip.model_validate_json,
+    ),
+)
+
+
+# Trip columns the statistics summary is built from
+STATISTICS_COLUMNS = (
+    "fare_amount",
+    "trip_distance",
+    "pickup_datetime",
+    "dropoff_datetime",
+)
+# Additive fields of a statistics delta
+STATISTICS_SUMS = ("count", "fare_sum", "fare_count", "distance_sum", "distance_count")
+
+# Same aggregate as `statistics_delta`, over a SQL row source
+STATISTICS_DELTA_SQL = """
+    SELECT
+        COUNT(*) AS count,
+        COALESCE(SUM(fare_amount), 0) AS fare_sum,
+        COUNT(fare_amount) AS fare_count,
+        COALESCE(SUM(trip_distance), 0) AS distance_sum,
+        COUNT(trip_distance) AS distance_count,
+        MIN(pickup_datetime) AS earliest,
+        MAX(dropoff_datetime) AS latest
+    FROM ({source}) AS rows
+"""
+
+# Upserted rows carry their own ids, which never advance the id sequence: move
+# it past the largest one (never backwards) so later inserts do not collide
+SEQUENCE_ADVANCE_SQL = """
+    SELECT setval(seq, GREATEST(max_id, COALESCE(pg_sequence_last_value(seq), 0)))
+    FROM (SELECT pg_get_serial_sequence('{table}', 'id')::regclass AS seq) AS s,
+         (SELECT MAX(id) AS max_id FROM {table}_staging) AS m
+    WHERE max_id IS NOT NULL
+"""
+
+# Additive columns of the summary row, carried over by `refresh_statistics`
+STATISTICS_SUMMARY_SUMS = (
+    "total_trips",
+    "fare_sum",
+    "fare_count",
+    "distance_sum",
+    "distance_count",
+)
+STATISTICS_SUMMARY_FIELDS = STATISTICS_SUMMARY_SUMS + (
+    "earliest_trip",
+    "latest_trip",
+    "is_stale",
+)
+
+# Background refresh shared by concurrent stale reads
+_statistics_refresh: "Optional[asyncio.Future]" = None
+
+
+def _summary_values(summary) -> Dict[str, Any]:
+    return {field: getattr(summary, field) for field in STATISTICS_SUMMARY_FIELDS}
+
+
+def _summary_statistics(summary) -> schemas.Statistics:
+    return schemas.Statistics(
+        total_trips=summary.total_trips,
+        earliest_trip=summary.earliest_trip,
+        latest_trip=summary.latest_trip,
+        average_fare=summary.average_fare,
+        average_distance=summary.average_distance,
+    )
+
+
+def _bound(pick, a, b):
+    """`pick` (min or max) of two optional values."""
+    values = [value for value in (a, b) if value is not None]
+    return pick(values) if values else None
+
+
+def _refresh_statistics_now() -> schemas.Statistics:
+    with SessionLocal() as session:
+        summary = TaxiTripService.refresh_statistics(session)
+        return _summary_statistics(summary)
+
+
+def _log_refresh_failure(task: "asyncio.Future"):
+    if not task.cancelled() and task.exception() is not None:
+        logging.error("Statistics refresh failed", exc_info=task.exception())
+
+
+def _statistics_row(trip) -> tuple:
+    return tuple(getattr(trip, column) for column in STATISTICS_COLUMNS)
+
+
+def statistics_delta(rows: Iterable[tuple]) -> Dict[str, Any]:
+    """Count, sums and time bounds of (fare, distance, pickup, dropoff) rows."""
+    delta: Dict[str, Any] = dict.fromkeys(STATISTICS_SUMS, 0)
+    delta.update(earliest=None, latest=None)
+    for fare, distance, pickup, dropoff in rows:
+        delta["count"] += 1
+        if fare is not None:
+            delta["fare_sum"] += fare
+            delta["fare_count"] += 1
+        if distance is not None:
+            delta["distance_sum"] += distance
+            delta["distance_count"] += 1
+        if pickup is not None and (
+            delta["earliest"] is None or pickup < delta["earliest"]
+        ):
+            delta["earliest"] = pickup
+        if dropoff is not None and (
+            delta["latest"] is None or dropoff > delta["latest"]
+        ):
+            delta["latest"] = dropoff
+    return delta
+
+
+def merge_statistics_deltas(*deltas: Dict[str, Any]) -> Dict[str, Any]:
+    merged = statistics_delta([])
+    for delta in deltas:
+        for key in STATISTICS_SUMS:
+            merged[key] += delta[key]
+        bounds = [d for d in (merged["earliest"], delta["earliest"]) if d is not None]
+        merged["earliest"] = min(bounds) if bounds else None
+        bounds = [d for d in (merged["latest"], delta["latest"]) if d is not None]
+        merged["latest"] = max(bounds) if bounds else None
+    return merged
+
+
+async def _sql_statistics_delta(raw, source: str) -> Dict[str, Any]:
+    """`statistics_delta` computed by Postgres over a SELECT (asyncpg connection)."""
+    return dict(await raw.fetchrow(STATISTICS_DELTA_SQL.format(source=source)))
 
 
 class TaxiTripService:
     @staticmethod
-    def get_trip(db: Session, trip_id: int):
-        """Retrieve a trip by its ID"""
-        return (
-            db.query(models.YellowTaxiTrip)
-            .filter(models.YellowTaxiTrip.id == trip_id)
-            .first()
-        )
+    def trip_filters(
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        pu_location_id: Optional[int] = None,
+        do_location_id: Optional[int] = None,
+        payment_type: Optional[int] = None,
+        min_fare: Optional[float] = None,
+        max_fare: Optional[float] = None,
+        min_distance: Optional[float] = None,
+        max_distance: Optional[float] = None,
+    ):
+        """Build WHERE clauses for the optional trip filters"""
+        trip = models.YellowTaxiTrip
+        conditions = []
+        if start is not None:
+            conditions.append(trip.pickup_datetime >= start)
+        if end is not None:
+            conditions.append(trip.pickup_datetime < end)
+        if pu_location_id is not None:
+            conditions.append(trip.pu_location_id == pu_location_id)
+        if do_location_id is not None:
+            conditions.append(trip.do_location_id == do_location_id)
+        if payment_type is not None:
+            conditions.append(trip.payment_type == payment_type)
+        if min_fare is not None:
+            conditions.append(trip.fare_amount >= min_fare)
+        if max_fare is not None:
+            conditions.append(trip.fare_amount <= max_fare)
+        if min_distance is not None:
+            conditions.append(trip.trip_distance >= min_distance)
+        if max_distance is not None:
+            conditions.append(trip.trip_distance <= max_distance)
+        return conditions
+
+    @staticmethod
+    async def get_trip(db: AsyncSession, trip_id: int):
+        """Retrieve a trip by its ID, reading through the trip cache"""
+        trip = trip_cache.get(trip_id)
+        if trip is not None:
+            return trip
+
+        db_trip = await db.get(models.YellowTaxiTrip, trip_id)
+        if db_trip is None:
+            return None
+        trip = schemas.TaxiTrip.model_validate(db_trip)
+        trip_cache.set(trip_id, trip)
+        return trip
 
     @staticmethod
-    def get_trips(db: Session, skip: int = 0, limit: int = 100):
-        """Retrieve a paginated list of trips"""
-        query = db.query(models.YellowTaxiTrip)
-        total = query.count()
-        trips = query.offset(skip).limit(limit).all()
+    async def get_trips(
+        db: AsyncSession, skip: int = 0, limit: int = 100, conditions=()
+    ):
+        """
+        Retrieve a paginated list of trips matching `conditions`.
+        Rows are returned as plain dicts built from column tuples: the data
+        comes straight from the database, so no ORM instances are built and
+        no per-row validation is done.
+        """
+        total = await db.scalar(
+            select(func.count()).select_from(models.YellowTaxiTrip).where(*conditions)
+        )
+        result = await db.execute(
+            select(*ROW_COLUMNS).where(*conditions).offset(skip).limit(limit)
+        )
+        trips = [dict(zip(ROW_COLUMN_NAMES, row)) for row in result]
         return trips, total
 
     @staticmethod
-    def create_trip(db: Session, trip: schemas.TaxiTripCreate):
+    async def create_trip(db: AsyncSession, trip: schemas.TaxiTripCreate):
         """Create a new trip"""
         db_trip = models.YellowTaxiTrip(**trip.dict())
         db.add(db_trip)
-        db.commit()
-        db.refresh(db_trip)
+        await TaxiTripService._apply_statistics_delta(
+            db, added=statistics_delta([_statistics_row(db_trip)])
+        )
+        await db.commit()
+        statistics_cache.invalidate()
+        await db.refresh(db_trip)
         return db_trip
 
     @staticmethod
-    def update_trip(db: Session, trip_id: int, trip: schemas.TaxiTripUpdate):
-        """Update an existing trip"""
-        db_trip = (
-            db.query(models.YellowTaxiTrip)
-            .filter(models.YellowTaxiTrip.id == trip_id)
-            .first()
+    async def bulk_upsert_trips(db: AsyncSession, batches: AsyncIterator[BulkBatch]):
+        """
+        Write validated batches in a single transaction using COPY, one batch
+        at a time. Rows without an id are copied straight into the table; rows
+        with an id go through a staging table and `INSERT ... ON CONFLICT DO
+        UPDATE`, the last occurrence of a repeated id winning.
+        """
+        table = models.YellowTaxiTrip.__tablename__
+        staging = f"{table}_staging"
+        conn = await db.connection()
+        # The asyncpg adapter only sends BEGIN with its first statement: issue
+        # one so the raw calls below (and the temp table) share the session's
+        # transaction instead of autocommitting one by one
+        await conn.exec_driver_sql("SELECT 1")
+        raw = (await conn.get_raw_connection()).driver_connection
+
+        columns = ", ".join(["id"] + TRIP_COLUMNS)
+        updates = ", ".join(f"{c} = EXCLUDED.{c}" for c in TRIP_COLUMNS)
+        latest = (
+            f"SELECT DISTINCT ON (id) {columns} FROM {staging} ORDER BY id, ord DESC"
         )
+        stat_index = [TRIP_COLUMNS.index(c) for c in STATISTICS_COLUMNS]
+        has_staging = False
+        added = []
+        removed = []
+        results = []
+        upserted_ids = []
+        async for batch in batches:
+            # Upserts go first so that their explicit ids are behind the
+            # sequence before this batch's new rows draw from it
+            if batch.upsert_rows:
+                if not has_staging:
+                    await raw.execute(
+                        f"CREATE TEMP TABLE IF NOT EXISTS {staging} "
+                        f"(LIKE {table} INCLUDING DEFAULTS, ord BIGSERIAL) "
+                        "ON COMMIT DROP"
+                    )
+                    has_staging = True
+                await raw.copy_records_to_table(
+                    staging, records=batch.upsert_rows, columns=["id"] + TRIP_COLUMNS
+                )
+                removed.append(
+                    await _sql_statistics_delta(
+                        raw,
+                        f"SELECT * FROM {table} WHERE id IN (SELECT id FROM {staging})",
+                    )
+                )
+                added.append(await _sql_statistics_delta(raw, latest))
+                await raw.execute(
+                    f"INSERT INTO {table} ({columns}) {latest} "
+                    f"ON CONFLICT (id) DO UPDATE SET {updates}"
+                )
+                await raw.execute(SEQUENCE_ADVANCE_SQL.format(table=table))
+                await raw.execute(f"TRUNCATE {staging}")
+                upserted_ids.extend(row[0] for row in batch.upsert_rows)
+            if batch.new_rows:
+                await raw.copy_records_to_table(
+                    table, records=batch.new_rows, columns=TRIP_COLUMNS
+                )
+                added.append(
+                    statistics_delta(
+                        tuple(row[i] for i in stat_index) for row in batch.new_rows
+                    )
+                )
+            results.append(batch.result())
+
+        await TaxiTripService._apply_statistics_delta(
+            db,
+            added=merge_statistics_deltas(*added),
+            removed=merge_statistics_deltas(*removed),
+        )
+        await db.commit()
+        statistics_cache.invalidate()
+        for trip_id in upserted_ids:
+            trip_cache.invalidate(trip_id)
+        return schemas.BulkResult(
+            accepted=sum(result.accepted for result in results),
+            rejected=sum(result.rejected for result in results),
+            batches=results,
+        )
+
+    @staticmethod
+    async def update_trip(
+        db: AsyncSession, trip_id: int, trip: schemas.TaxiTripUpdate
+    ):
+        """Update an existing trip"""
+        db_trip = await db.get(models.YellowTaxiTrip, trip_id)
         if not db_trip:
             return None
+        removed = statistics_delta([_statistics_row(db_trip)])
         for key, value in trip.dict(exclude_unset=True).items():
             setattr(db_trip, key, value)
-        db.commit()
-        db.refresh(db_trip)
+        await TaxiTripService._apply_statistics_delta(
+            db, added=statistics_delta([_statistics_row(db_trip)]), removed=removed
+        )
+        await db.commit()
+        statistics_cache.invalidate()
+        trip_cache.invalidate(trip_id)
+        await db.refresh(db_trip)
         return db_trip
 
     @staticmethod
-    def delete_trip(db: Session, trip_id: int):
+    async def delete_trip(db: AsyncSession, trip_id: int):
         """Delete a trip"""
-        db_trip = (
-            db.query(models.YellowTaxiTrip)
-            .filter(models.YellowTaxiTrip.id == trip_id)
-            .first()
-        )
+        db_trip = await db.get(models.YellowTaxiTrip, trip_id)
         if not db_trip:
             return False
-        db.delete(db_trip)
-        db.commit()
+        await db.delete(db_trip)
+        await TaxiTripService._apply_statistics_delta(
+            db, removed=statistics_delta([_statistics_row(db_trip)])
+        )
+        await db.commit()
+        statistics_cache.invalidate()
+        trip_cache.invalidate(trip_id)
         return True
 
     @staticmethod
-    def get_statistics(db: Session):
-        """Compute trip statistics"""
-        total_trips = db.query(func.count(models.YellowTaxiTrip.id)).scalar()
-        earliest_trip = db.query(
-            func.min(models.YellowTaxiTrip.pickup_datetime)
-        ).scalar()
-        latest_trip = db.query(
-            func.max(models.YellowTaxiTrip.dropoff_datetime)
-        ).scalar()
-        average_fare = db.query(func.avg(models.YellowTaxiTrip.fare_amount)).scalar()
-        average_distance = db.query(
-            func.avg(models.YellowTaxiTrip.trip_distance)
-        ).scalar()
-
-        return schemas.Statistics(
-            total_trips=total_trips or 0,
-            earliest_trip=earliest_trip,
-            latest_trip=latest_trip,
-            average_fare=average_fare,
-            average_distance=average_distance,
+    async def _apply_statistics_delta(
+        db: AsyncSession,
+        added: Optional[Dict[str, Any]] = None,
+        removed: Optional[Dict[str, Any]] = None,
+    ):
+        """
+        Apply the trips written in this transaction to the statistics summary
+        (`statistics_delta` of the rows added and removed). Counts and sums
+        are exact; removing the earliest or latest trip flags the summary
+        stale, so the next read recomputes it.
+        """
+        added = added or statistics_delta([])
+        removed = removed or statistics_delta([])
+        summary = models.TripStatisticsSummary
+
+        def plus(column, key):
+            return func.coalesce(column, 0) + added[key] - removed[key]
+
+        values = {
+            "total_trips": summary.total_trips + added["count"] - removed["count"],
+            "fare_sum": plus(summary.fare_sum, "fare_sum"),
+            "fare_count": plus(summary.fare_count, "fare_count"),
+            "distance_sum": plus(summary.distance_sum, "distance_sum"),
+            "distance_count": plus(summary.distance_count, "distance_count"),
+            "average_fare": plus(summary.fare_sum, "fare_sum")
+            / func.nullif(plus(summary.fare_count, "fare_count"), 0),
+            "average_distance": plus(summary.distance_sum, "distance_sum")
+            / func.nullif(plus(summary.distance_count, "distance_count"), 0),
+        }
+        if added["earliest"] is not None:
+            values["earliest_trip"] = func.least(
+                summary.earliest_trip, added["earliest"]
+            )
+        if added["latest"] is not None:
+            values["latest_trip"] = func.greatest(summary.latest_trip, added["latest"])
+        stale = []
+        if removed["earliest"] is not None:
+            stale.append(summary.earliest_trip >= removed["earliest"])
+        if removed["latest"] is not None:
+            stale.append(summary.latest_trip <= removed["latest"])
+        if stale:
+            values["is_stale"] = func.coalesce(or_(summary.is_stale, *stale), True)
+
+        # Row lock held until commit: a concurrent refresh cannot drop the delta
+        await db.execute(
+            update(summary)
+            .where(summary.id == STATISTICS_SUMMARY_ID)
+            .values(values)
+        )
+
+    @staticmethod
+    def refresh_statistics(db: Session):
+        """
+        Recompute the statistics summary in a single aggregate pass without
+        holding up writers. The aggregate and the summary row are read in one
+        REPEATABLE READ snapshot; the deltas writers applied to the row since
+        that snapshot are then carried over under a short row lock.
+        Synchronous, for pipeline jobs and the API's background refresh; the
+        session's open transaction is committed first.
+        """
+        trip = models.YellowTaxiTrip
+        summary = models.TripStatisticsSummary
+        db.commit()
+        db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+        before = db.get(summary, STATISTICS_SUMMARY_ID)
+        before = _summary_values(before) if before is not None else None
+        (
+            total_trips,
+            earliest_trip,
+            latest_trip,
+            fare_sum,
+            fare_count,
+            distance_sum,
+            distance_count,
+        ) = db.query(
+            func.count(trip.id),
+            func.min(trip.pickup_datetime),
+            func.max(trip.dropoff_datetime),
+            func.sum(trip.fare_amount),
+            func.count(trip.fare_amount),
+            func.sum(trip.trip_distance),
+            func.count(trip.trip_distance),
+        ).one()
+        db.commit()
+
+        values = {
+            "total_trips": total_trips or 0,
+            "earliest_trip": earliest_trip,
+            "latest_trip": latest_trip,
+            "fare_sum": fare_sum or 0.0,
+            "fare_count": fare_count or 0,
+            "distance_sum": distance_sum or 0.0,
+            "distance_count": distance_count or 0,
+            "is_stale": False,
+        }
+        # Writers update the row under its lock: hold it only to add their
+        # deltas since the snapshot on top of the aggregate
+        current = (
+            db.query(summary)
+            .filter(summary.id == STATISTICS_SUMMARY_ID)
+            .with_for_update()
+            .one_or_none()
         )
+        if before is not None and current is not None:
+            current = _summary_values(current)
+            if current != before:
+                for field in STATISTICS_SUMMARY_SUMS:
+                    values[field] += (current[field] or 0) - (before[field] or 0)
+                # Bounds only move outwards when trips are added
+                if current["earliest_trip"] != before["earliest_trip"]:
+                    values["earliest_trip"] = _bound(
+                        min, values["earliest_trip"], current["earliest_trip"]
+                    )
+                if current["latest_trip"] != before["latest_trip"]:
+                    values["latest_trip"] = _bound(
+                        max, values["latest_trip"], current["latest_trip"]
+                    )
+                # A boundary trip may have been removed meanwhile
+                values["is_stale"] = bool(current["is_stale"])
+        values.update(
+            average_fare=(
+                values["fare_sum"] / values["fare_count"]
+                if values["fare_count"]
+                else None
+            ),
+            average_distance=(
+                values["distance_sum"] / values["distance_count"]
+                if values["distance_count"]
+                else None
+            ),
+            refreshed_at=datetime.utcnow(),
+        )
+        stmt = insert(summary).values(id=STATISTICS_SUMMARY_ID, **values)
+        db.execute(stmt.on_conflict_do_update(index_elements=["id"], set_=values))
+        db.commit()
+        statistics_cache.invalidate()
+        return db.get(summary, STATISTICS_SUMMARY_ID, populate_existing=True)
+
+    @staticmethod
+    def refresh_statistics_in_background() -> "asyncio.Future":
+        """
+        Start a statistics refresh in a worker thread, or return the one
+        already running, so concurrent stale reads share a single aggregate.
+        """
+        global _statistics_refresh
+        if _statistics_refresh is None or _statistics_refresh.done():
+            _statistics_refresh = asyncio.ensure_future(
+                run_in_threadpool(_refresh_statistics_now)
+            )
+            _statistics_refresh.add_done_callback(_log_refresh_failure)
+        return _statistics_refresh
+
+    @staticmethod
+    async def get_statistics(db: AsyncSession):
+        """
+        Return trip statistics from the cache or the materialised summary.
+        A stale summary is served as is while a background refresh runs.
+        """
+        stats = statistics_cache.get("statistics")
+        if stats is not None:
+            return stats
+
+        summary = await db.get(models.TripStatisticsSummary, STATISTICS_SUMMARY_ID)
+        if summary is None:
+            return await TaxiTripService.refresh_statistics_in_background()
+
+        stats = _summary_statistics(summary)
+        # Summaries written before the running sums existed are refreshed once
+        if summary.is_stale or summary.fare_count is None:
+            TaxiTripService.refresh_statistics_in_background()
+        else:
+            statistics_cache.set("statistics", stats)
+        return stats
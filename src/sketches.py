@@ -0,0 +1,336 @@
+"""
+Mergeable per-month sketches of trip metrics.
+
+- `KLLSketch`: KLL quantile sketch (numpy compactors, weight 2**level per
+  item) for fare, distance and duration; rank error ~1.7/k.
+- `HyperLogLog`: distinct (pickup zone, dropoff zone) pairs; standard
+  error ~1.04/sqrt(2**precision).
+
+`DataCleaner` feeds every cleaned batch into one `TripSketch` per pickup
+month and persists them as `SKETCH_DIR/YYYY-MM.npz`. Percentiles for a
+month range merge the stored sketches, so the cost depends on the number
+of months, not on the number of trips.
+"""
+
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from src.schemas import DEFAULT_QUANTILES
+
+SKETCH_DIR = os.getenv("SKETCH_DIR", "data/sketches")
+KLL_K = int(os.getenv("SKETCH_KLL_K", "400"))
+HLL_PRECISION = int(os.getenv("SKETCH_HLL_PRECISION", "12"))
+
+QUANTILE_METRICS = ("fare_amount", "trip_distance", "duration_minutes")
+
+
+class KLLSketch:
+    def __init__(self, k: int = KLL_K):
+        self.k = k
+        self.n = 0
+        self.levels: List[np.ndarray] = [np.empty(0)]
+        self._rng = np.random.default_rng()
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(int(np.ceil(self.k * (2 / 3) ** depth)), 2)
+
+    def update(self, values: Iterable[float]):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[np.isfinite(values)]
+        if values.size:
+            self.n += values.size
+            self.levels[0] = np.concatenate([self.levels[0], values])
+            self._compress()
+
+    def merge(self, other: "KLLSketch"):
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.n += other.n
+        self._compress()
+
+    def _compress(self):
+        # Adding a level lowers the capacity of those below it: repeat until
+        # every level fits
+        compacted = True
+        while compacted:
+            compacted = False
+            for level in range(len(self.levels)):
+                items = self.levels[level]
+                if items.size <= self._capacity(level):
+                    continue
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(items)
+                # An odd item stays behind; every other survivor moves up
+                # with twice the weight, starting at a random offset
+                keep, items = items[: items.size % 2], items[items.size % 2 :]
+                promoted = items[self._rng.integers(2) :: 2]
+                self.levels[level] = keep
+                self.levels[level + 1] = np.concatenate(
+                    [self.levels[level + 1], promoted]
+                )
+                compacted = True
+
+    def quantiles(self, qs: Iterable[float]) -> List[Optional[float]]:
+        qs = list(qs)
+        if self.n == 0:
+            return [None] * len(qs)
+        items = np.concatenate(self.levels)
+        weights = np.concatenate(
+            [
+                np.full(compactor.size, 2**level, dtype=np.int64)
+                for level, compactor in enumerate(self.levels)
+            ]
+        )
+        order = np.argsort(items, kind="stable")
+        cumulative = np.cumsum(weights[order])
+        ranks = np.asarray(qs, dtype=np.float64) * cumulative[-1]
+        index = np.minimum(np.searchsorted(cumulative, ranks), items.size - 1)
+        return [float(v) for v in items[order][index]]
+
+    def to_arrays(self, prefix: str) -> Dict[str, np.ndarray]:
+        return {
+            f"{prefix}_items": np.concatenate(self.levels),
+            f"{prefix}_sizes": np.array([level.size for level in self.levels]),
+            f"{prefix}_meta": np.array([self.k, self.n]),
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix: str) -> "KLLSketch":
+        k, n = (int(v) for v in arrays[f"{prefix}_meta"])
+        sketch = cls(k)
+        sketch.n = n
+        bounds = np.cumsum(arrays[f"{prefix}_sizes"])[:-1]
+        sketch.levels = list(np.split(arrays[f"{prefix}_items"], bounds))
+        return sketch
+
+
+def _hash64(values: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer: well-mixed 64-bit hashes of integer keys."""
+    x = values.astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+class HyperLogLog:
+    def __init__(self, precision: int = HLL_PRECISION):
+        # The rank bits must fit a float64 mantissa for the frexp below
+        if not 11 <= precision <= 18:
+            raise ValueError("HyperLogLog precision must be between 11 and 18")
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def update_hashes(self, hashes: np.ndarray):
+        p = self.precision
+        index = (hashes >> np.uint64(64 - p)).astype(np.intp)
+        rest = hashes & np.uint64((1 << (64 - p)) - 1)
+        # frexp exponent == bit length for rest > 0, and 0 for rest == 0
+        bit_length = np.frexp(rest.astype(np.float64))[1]
+        rank = (64 - p - bit_length + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def update(self, keys: np.ndarray):
+        self.update_hashes(_hash64(np.asarray(keys)))
+
+    def folded(self, precision: int) -> np.ndarray:
+        """Registers of this sketch re-bucketed to a lower `precision`."""
+        if precision > self.precision:
+            raise ValueError(
+                f"Cannot raise HyperLogLog precision from {self.precision} "
+                f"to {precision}"
+            )
+        shift = self.precision - precision
+        if shift == 0:
+            return self.registers
+        # The index bits dropped become the leading bits of the hash rest
+        low = np.arange(self.registers.size) & ((1 << shift) - 1)
+        low_rank = shift - np.frexp(low.astype(np.float64))[1] + 1
+        rank = np.where(
+            self.registers == 0,
+            0,
+            np.where(low > 0, low_rank, self.registers.astype(int) + shift),
+        ).astype(np.uint8)
+        return rank.reshape(-1, 1 << shift).max(axis=1)
+
+    def merge(self, other: "HyperLogLog"):
+        """
+        Union with `other`. Sketches of different precisions are merged at
+        the lower one, which this sketch then keeps.
+        """
+        precision = min(self.precision, other.precision)
+        if precision < self.precision:
+            self.registers = self.folded(precision)
+            self.precision = precision
+        np.maximum(self.registers, other.folded(precision), out=self.registers)
+
+    def estimate(self) -> int:
+        m = self.registers.size
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(int)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            # Small range: linear counting is more accurate
+            estimate = m * np.log(m / zeros)
+        return int(round(estimate))
+
+
+class TripSketch:
+    """Quantile sketches, distinct zone pairs and trip count of one month."""
+
+    def __init__(self, k: int = KLL_K, precision: int = HLL_PRECISION):
+        self.trips = 0
+        self.quantiles = {metric: KLLSketch(k) for metric in QUANTILE_METRICS}
+        self.zone_pairs = HyperLogLog(precision)
+
+    def update(self, metrics: Dict[str, np.ndarray], pu: np.ndarray, do: np.ndarray):
+        self.trips += len(pu)
+        for metric, sketch in self.quantiles.items():
+            sketch.update(metrics[metric])
+        pairs = np.asarray(pu, dtype=np.int64) * 1000 + np.asarray(do, dtype=np.int64)
+        self.zone_pairs.update(pairs)
+
+    def merge(self, other: "TripSketch"):
+        self.trips += other.trips
+        for metric, sketch in self.quantiles.items():
+            sketch.merge(other.quantiles[metric])
+        self.zone_pairs.merge(other.zone_pairs)
+
+    def save(self, path: Path):
+        """Write atomically, so readers never see a partial file."""
+        arrays = {
+            "trips": np.array([self.trips]),
+            "hll": self.zone_pairs.registers,
+        }
+        for metric, sketch in self.quantiles.items():
+            arrays.update(sketch.to_arrays(metric))
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "TripSketch":
+        with np.load(path) as arrays:
+            registers = arrays["hll"]
+            sketch = cls(precision=int(registers.size).bit_length() - 1)
+            sketch.trips = int(arrays["trips"][0])
+            sketch.zone_pairs.registers = registers.copy()
+            for metric in QUANTILE_METRICS:
+                sketch.quantiles[metric] = KLLSketch.from_arrays(arrays, metric)
+        return sketch
+
+
+def update_monthly(
+    sketches: Dict[str, TripSketch], df, pickup_col: str, dropoff_col: str
+):
+    """
+    Add a cleaned DataFrame batch to `sketches` (one per "YYYY-MM" pickup
+    month). Column names follow the Postgres `yellow_taxi_trips` table.
+    """
+    pickup = df[pickup_col]
+    duration = (df[dropoff_col] - pickup).dt.total_seconds() / 60
+    month = (pickup.dt.year * 100 + pickup.dt.month).to_numpy()
+    for key in np.unique(month):
+        rows = month == key
+        name = f"{key // 100:04d}-{key % 100:02d}"
+        sketches.setdefault(name, TripSketch()).update(
+            {
+                "fare_amount": df["fare_amount"].to_numpy()[rows],
+                "trip_distance": df["trip_distance"].to_numpy()[rows],
+                "duration_minutes": duration.to_numpy()[rows],
+            },
+            df["pu_location_id"].to_numpy()[rows],
+            df["do_location_id"].to_numpy()[rows],
+        )
+
+
+def save_monthly(
+    sketches: Dict[str, TripSketch],
+    directory: str = SKETCH_DIR,
+    merge: bool = False,
+    prune: bool = False,
+):
+    """
+    Store `sketches`, replacing the stored sketch of each month, or adding
+    to it with `merge` (incremental loads). `prune` removes stored months
+    missing from `sketches`.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    for month, sketch in sketches.items():
+        path = directory / f"{month}.npz"
+        if merge and path.exists():
+            stored = TripSketch.load(path)
+            stored.merge(sketch)
+            sketch = stored
+        sketch.save(path)
+    if prune:
+        for path in directory.glob("*.npz"):
+            if path.stem not in sketches:
+                path.unlink()
+
+
+class SketchStore:
+    """Loads stored month sketches (cached by file mtime) and merges ranges."""
+
+    def __init__(self, directory: str = SKETCH_DIR):
+        self.directory = Path(directory)
+        self._loaded: Dict[str, Tuple[int, TripSketch]] = {}
+        self._lock = threading.Lock()
+
+    def months(self) -> List[str]:
+        return sorted(path.stem for path in self.directory.glob("*.npz"))
+
+    def _get(self, month: str) -> TripSketch:
+        path = self.directory / f"{month}.npz"
+        mtime = path.stat().st_mtime_ns
+        with self._lock:
+            cached = self._loaded.get(month)
+            if cached is None or cached[0] != mtime:
+                cached = (mtime, TripSketch.load(path))
+                self._loaded[month] = cached
+        return cached[1]
+
+    def percentiles(
+        self,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        qs: Iterable[float] = DEFAULT_QUANTILES,
+    ) -> Dict:
+        """
+        Merge the sketches of months `start`..`end` ("YYYY-MM", inclusive)
+        and return trip count, distinct zone pairs and the `qs` quantiles
+        of every metric.
+        """
+        qs = list(qs)
+        months = [
+            m
+            for m in self.months()
+            if (start is None or m >= start) and (end is None or m <= end)
+        ]
+        merged = TripSketch()
+        for month in months:
+            merged.merge(self._get(month))
+        return {
+            "months": months,
+            "total_trips": merged.trips,
+            "distinct_zone_pairs": merged.zone_pairs.estimate(),
+            "percentiles": {
+                metric: {
+                    f"p{q * 100:g}": value
+                    for q, value in zip(qs, sketch.quantiles(qs))
+                }
+                for metric, sketch in merged.quantiles.items()
+            },
+        }
+
+
+store = SketchStore(SKETCH_DIR)
@@ -0,0 +1,79 @@
+"""
+`POST /trips/bulk` write path against a real Postgres (see `.env.example`);
+skipped when none is reachable. The trips it writes are deleted afterwards
+and the statistics summary is flagged stale.
+"""
+
+import asyncio
+
+import pytest
+
+pytest.importorskip("psycopg2")
+pytest.importorskip("asyncpg")
+
+from sqlalchemy import text  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine  # noqa: E402
+from sqlalchemy.pool import NullPool  # noqa: E402
+
+from src import bulk  # noqa: E402
+from src.database import ASYNC_DATABASE_URL, engine, init_db  # noqa: E402
+from src.services import TaxiTripService  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def conn():
+    try:
+        connection = engine.connect()
+    except OperationalError as e:
+        pytest.skip(f"Postgres unavailable: {e}")
+    connection.close()
+    init_db()
+    with engine.connect() as connection:
+        yield connection
+
+
+async def _upsert(records):
+    async def batches():
+        for batch in bulk.validate_batches(records):
+            yield batch
+
+    # A fresh engine per event loop: asyncpg connections are bound to theirs
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, poolclass=NullPool)
+    try:
+        async with AsyncSession(async_engine) as db:
+            return await TaxiTripService.bulk_upsert_trips(db, batches())
+    finally:
+        await async_engine.dispose()
+
+
+def test_bulk_upsert(conn):
+    first_id = conn.execute(
+        text("SELECT COALESCE(MAX(id), 0) + 1000 FROM yellow_taxi_trips")
+    ).scalar()
+    conn.commit()
+    records = [
+        {"id": first_id, "vendor_id": "1", "fare_amount": 1.0},
+        {"id": first_id, "vendor_id": "1", "fare_amount": 2.0},
+        {"vendor_id": "2", "fare_amount": 3.0},
+        {"id": 0, "fare_amount": 4.0},
+    ]
+    result = asyncio.run(_upsert(records))
+    try:
+        assert (result.accepted, result.rejected) == (3, 1)
+
+        rows = conn.execute(
+            text("SELECT id, fare_amount FROM yellow_taxi_trips WHERE id >= :id"),
+            {"id": first_id},
+        ).all()
+        # The last occurrence of a repeated id wins, and the inserted row
+        # draws an id past the upserted ones
+        assert dict(rows)[first_id] == 2.0
+        assert len(rows) == 2
+        assert max(row_id for row_id, _ in rows) > first_id
+    finally:
+        conn.execute(
+            text("DELETE FROM yellow_taxi_trips WHERE id >= :id"), {"id": first_id}
+        )
+        conn.execute(text("UPDATE trip_statistics_summary SET is_stale = TRUE"))
+        conn.commit()
@@ -0,0 +1,34 @@
+"""
+The common `GET /trips` filters must be served by an index scan.
+
+Needs a reachable Postgres with the trips table (see `.env.example`); the
+test is skipped otherwise. Sequential scans are disabled for the check, so
+it passes on a small table as long as an index is usable for every filter.
+"""
+
+import pytest
+
+pytest.importorskip("psycopg2")
+
+from sqlalchemy import text  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+
+from benchmarks.explain_filters import COMMON_FILTERS, explain, uses_index  # noqa: E402
+from src.database import engine  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def conn():
+    try:
+        connection = engine.connect()
+    except OperationalError as e:
+        pytest.skip(f"Postgres unavailable: {e}")
+    with connection:
+        connection.execute(text("SET enable_seqscan = off"))
+        yield connection
+
+
+@pytest.mark.parametrize("name", sorted(COMMON_FILTERS))
+def test_filter_uses_index(conn, name):
+    nodes = explain(conn, COMMON_FILTERS[name])
+    assert uses_index(nodes), f"{name}: {' -> '.join(nodes)}"
@@ -0,0 +1,17 @@
+"""
+The API must import and start within the cold-start budget without loading
+any heavy pipeline module (see `benchmarks.startup`).
+"""
+
+from benchmarks.startup import STARTUP_BUDGET_MS, measure
+
+
+def test_cold_start_within_budget():
+    result = measure(repeat=3)
+    total_ms = result["seconds"] * 1000
+    heavy = ", ".join(result["heavy_modules"])
+    assert not heavy, f"heavy modules loaded: {heavy}"
+    assert total_ms <= STARTUP_BUDGET_MS, (
+        f"import {result['import_ms']:.0f} ms + startup "
+        f"{result['startup_ms']:.0f} ms over the {STARTUP_BUDGET_MS:.0f} ms budget"
+    )